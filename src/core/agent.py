@@ -0,0 +1,336 @@
+# src/core/agent.py
+from __future__ import annotations
+
+import concurrent.futures, threading, time, uuid
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .executor import plan, run_tool_calls
+from ..mcp.client import cancel_scope
+from .registry import ToolRegistry
+from .shaping import PAGE_TOOL, ResultShaper
+from .toolselect import ToolSelector
+from .validate import ArgumentError, parse_arguments
+from ..utils import codec
+
+
+@dataclass
+class AgentStep:
+    step: int
+    llm_ms: float
+    ttft_ms: Optional[float] = None  # primer token (sólo en streaming)
+    tools_ms: float = 0.0
+    tools: List[str] = field(default_factory=list)
+    speculated: int = 0                # tools lanzadas antes de terminar el stream
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@dataclass
+class AgentResult:
+    text: str
+    steps: List[AgentStep]
+    stop: str                      # "answer" | "max_steps" | "budget"
+    tokens: int = 0
+
+    @property
+    def used_tools(self) -> bool:
+        return any(s.tools for s in self.steps)
+
+
+def _tool_call_dict(tc: Any) -> Dict[str, Any]:
+    if hasattr(tc, "model_dump"):
+        return tc.model_dump(exclude_none=True)
+    return {"id": tc.id, "type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+
+
+def _as_call(c: Dict[str, str]) -> Any:
+    return SimpleNamespace(id=c["id"], type="function", function=SimpleNamespace(name=c["name"], arguments=c["arguments"]))
+
+
+def _collect_stream(
+    stream: Any, on_delta: Callable[[str], None], t0: float,
+    on_call: Optional[Callable[[int, List[Any]], None]] = None,
+) -> Tuple[str, List[Any], Any, Optional[float]]:
+    """
+    Consume un stream de chat.completions: emite el texto acumulado en cada delta y
+    re-arma los `tool_calls` (llegan en trozos por índice: id/nombre primero, luego
+    los argumentos por pedazos). Devuelve (texto, tool_calls, usage, ttft_ms).
+    `on_call(i, calls[:i+1])` se invoca una vez por tool_call apenas sus argumentos
+    son JSON válido, aunque el resto del mensaje siga llegando.
+    """
+    text = ""
+    calls: Dict[int, Dict[str, str]] = {}
+    ready: Set[int] = set()
+    usage = None
+    ttft: Optional[float] = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if ttft is None and (delta.content or delta.tool_calls):
+                ttft = (time.perf_counter() - t0) * 1000
+            if delta.content:
+                text += delta.content
+                on_delta(text)
+            for part in delta.tool_calls or []:
+                slot = calls.setdefault(part.index, {"id": "", "name": "", "arguments": ""})
+                if part.id:
+                    slot["id"] = part.id
+                fn = part.function
+                if fn is not None:
+                    slot["name"] += fn.name or ""
+                    slot["arguments"] += fn.arguments or ""
+                    i = part.index
+                    if on_call and i not in ready and slot["arguments"].rstrip().endswith("}"):
+                        try:
+                            codec.loads(slot["arguments"])
+                        except ValueError:
+                            continue
+                        ready.add(i)
+                        on_call(i, [_as_call(calls[k]) for k in sorted(calls) if k <= i])
+    finally:
+        close = getattr(stream, "close", None)
+        if callable(close):
+            close()  # Ctrl-C a mitad: corta la conexión HTTP
+    for c in calls.values():
+        c["id"] = c["id"] or str(uuid.uuid4())
+    return text, [_as_call(c) for _, c in sorted(calls.items())], usage, ttft
+
+
+class Agent:
+    """
+    Bucle de tool-calling: pide al modelo, ejecuta sus tool_calls (en paralelo, ver
+    executor) y vuelve a preguntar con las tools disponibles en cada paso, hasta que
+    conteste sin tool_calls. Límites: `max_steps` pasos y `token_budget` tokens
+    (prompt+completion acumulados); al llegar a cualquiera de los dos, el último paso
+    va con tool_choice="none" para forzar la respuesta final.
+    Con stream=True cada paso usa `stream=True` y `on_delta(texto_parcial)` recibe la
+    respuesta a medida que llega (el texto de un paso reemplaza al del anterior).
+    Ejecución especulativa (sólo en streaming): una tool de sólo lectura incluida en
+    `speculate` (None = todas las readonly del registro) se despacha apenas sus
+    argumentos parsean, solapando la latencia MCP con la generación del resto.
+    Con `shaper`, cada resultado que pase su presupuesto de tokens llega recortado y
+    el modelo puede pedir el resto con tool_result_page (se resuelve aquí mismo).
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        registry: ToolRegistry,
+        selector: ToolSelector,
+        max_steps: int = 6,
+        token_budget: int = 16000,
+        temperature: float = 0.3,
+        max_tokens: int = 800,
+        stream: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        speculate: Optional[Set[str]] = None,
+        format_result: Optional[Callable[[Dict[str, Any], str], str]] = None,  # (respuesta, tool)
+        shaper: Optional[ResultShaper] = None,
+        on_status: Optional[Callable[[str], None]] = None,
+        on_note: Optional[Callable[[str], None]] = None,
+        log: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.registry = registry
+        self.selector = selector
+        self.max_steps = max(1, max_steps)
+        self.token_budget = token_budget
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.stream = stream
+        self.on_delta = on_delta or (lambda _t: None)
+        self.speculate = speculate
+        self.format_result = format_result or (lambda r, _tool: codec.dumps_str(r, indent=True))
+        self.shaper = shaper
+        self.on_status = on_status or (lambda _t: None)
+        self.on_note = on_note or (lambda _t: None)
+        self.log = log or (lambda _e: None)
+        self.last_raw: Optional[str] = None  # payload crudo de la última tool (para :raw)
+        self._cancel = threading.Event()     # Ctrl-C del paso: cancela las llamadas en otros hilos
+
+    # ---- tools ----
+    def _dispatch(self, tc: Any) -> Dict[str, Any]:
+        try:
+            args = parse_arguments(tc.function.name, tc.function.arguments)
+        except ArgumentError as e:
+            return e.result()  # JSON roto: se devuelve al modelo sin ir al server
+        if tc.function.name == PAGE_TOOL and self.shaper is not None:
+            return self.shaper.page(args)
+        return self.registry.dispatch(tc.function.name, args)
+
+    def _can_speculate(self, name: str) -> bool:
+        spec = self.registry.get(name)
+        if spec is None or not spec.readonly:
+            return False  # nunca fs_write_text, sql_apply, git_commit_msg…
+        return self.speculate is None or name in self.speculate
+
+    def execute(
+        self, tool_calls: List[Any], started: Optional[Dict[int, "concurrent.futures.Future"]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ejecuta las tool_calls de un paso y arma los mensajes `tool` en el orden original.
+        `started`: las que ya se lanzaron especulativamente (se reusa su resultado).
+        """
+        names = [tc.function.name for tc in tool_calls]
+        for name in names:
+            self.selector.record(name)
+
+        futures = run_tool_calls(
+            self.registry, names, lambda i: self._dispatch(tool_calls[i]), started=started, cancel=self._cancel,
+        )
+        out: List[Dict[str, Any]] = []
+        for tc, name, fut in zip(tool_calls, names, futures):
+            tc_id = getattr(tc, "id", None) or str(uuid.uuid4())
+            try:
+                while not fut.done():
+                    concurrent.futures.wait([fut], timeout=0.2)  # corto: deja pasar Ctrl-C
+                resp = fut.result()
+                self.last_raw = codec.dumps_str(resp, indent=True)
+                content = self.format_result(resp, name)
+                if self.shaper is not None:
+                    content, handle = self.shaper.shape(name, resp, content)
+                    if handle is not None:
+                        self.selector.record(PAGE_TOOL)  # que el siguiente paso pueda paginar
+            except KeyboardInterrupt:
+                # Ctrl-C cancela el resto del paso: también las llamadas que corren en otros hilos
+                self._cancel.set()
+                self.on_note(f"Llamada a {name} cancelada.")
+                content = f"CANCELADO por el usuario: {name}"
+            except concurrent.futures.CancelledError:
+                content = f"CANCELADO por el usuario: {name}"
+            except Exception as e:
+                content = f"ERROR ejecutando {name}: {e}"
+            out.append({"role": "tool", "tool_call_id": tc_id, "content": content})
+        return out
+
+    # ---- bucle ----
+    def run(self, messages: List[Dict[str, Any]], query: str) -> AgentResult:
+        """
+        `messages` ya incluye el turno del usuario; `query` se usa para elegir tools. Las
+        tools se re-eligen en cada paso: desde el segundo, con lo que dijo el modelo y las
+        tools que acaba de llamar sumados a la consulta.
+        """
+        messages = list(messages)
+        step_query = query
+        steps: List[AgentStep] = []
+        used = 0
+        stop = "answer"
+        text = ""
+
+        for n in range(1, self.max_steps + 1):
+            # Último paso (o presupuesto agotado): sin tools, el modelo debe contestar
+            forced = n == self.max_steps or used >= self.token_budget
+            if forced:
+                stop = "budget" if used >= self.token_budget else "max_steps"
+            self.on_status(f"Pensando… (paso {n}/{self.max_steps})" if n > 1 else "Pensando…")
+            self._cancel = threading.Event()
+
+            text, tool_calls, step, started = self._complete(n, messages, step_query, forced)
+            used += step.prompt_tokens + step.completion_tokens
+            steps.append(step)
+
+            if not tool_calls or forced:
+                if not forced:
+                    stop = "answer"
+                self._log_step(step)
+                break
+
+            step.tools = [tc.function.name for tc in tool_calls]
+            self.on_status(f"Ejecutando {len(tool_calls)} tool(s)… (paso {n}/{self.max_steps})")
+            t1 = time.perf_counter()
+            results = self.execute(tool_calls, started)
+            step.tools_ms = (time.perf_counter() - t1) * 1000
+            self._log_step(step)
+
+            messages.append({
+                "role": "assistant",
+                "content": text,
+                "tool_calls": [_tool_call_dict(tc) for tc in tool_calls],
+            })
+            messages.extend(results)
+            step_query = " ".join([query, text or ""] + step.tools)
+        return AgentResult(text=text, steps=steps, stop=stop, tokens=used)
+
+    def _complete(
+        self, n: int, messages: List[Dict[str, Any]], query: str, forced: bool,
+    ) -> Tuple[str, List[Any], AgentStep, Dict[int, "concurrent.futures.Future"]]:
+        """Un pedido al modelo (normal o en streaming) → (texto, tool_calls, métricas, especuladas)."""
+        kwargs: Dict[str, Any] = dict(
+            model=self.model,
+            messages=messages,
+            tools=self.selector.select(query),
+            tool_choice="none" if forced else "auto",
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+        t0 = time.perf_counter()
+        started: Dict[int, concurrent.futures.Future] = {}
+        if self.stream:
+            stream = self.client.chat.completions.create(
+                **kwargs, stream=True, stream_options={"include_usage": True},
+            )
+            on_call = None if forced or self.speculate == set() else self._speculator(started)
+            try:
+                text, tool_calls, usage, ttft = _collect_stream(stream, self.on_delta, t0, on_call)
+            except KeyboardInterrupt:
+                # Ctrl-C a media respuesta: las tools ya especuladas también se cancelan
+                self._cancel.set()
+                raise
+        else:
+            reply = self.client.chat.completions.create(**kwargs)
+            msg = reply.choices[0].message
+            text, tool_calls = msg.content or "", list(getattr(msg, "tool_calls", None) or [])
+            usage, ttft = getattr(reply, "usage", None), None
+
+        step = AgentStep(step=n, llm_ms=(time.perf_counter() - t0) * 1000, ttft_ms=ttft, speculated=len(started))
+        if usage is not None:
+            step.prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0)
+            step.completion_tokens = int(getattr(usage, "completion_tokens", 0) or 0)
+        return text, tool_calls, step, started
+
+    def _speculator(self, started: Dict[int, "concurrent.futures.Future"]) -> Callable[[int, List[Any]], None]:
+        """Callback de _collect_stream: lanza la tool i si es segura y no depende de otra."""
+        def on_call(i: int, calls: List[Any]):
+            names = [c.function.name for c in calls]
+            if not self._can_speculate(names[i]):
+                return
+            # Si depende de una anterior que no se lanzó (p. ej. una escritura), espera al final
+            deps = plan(self.registry, names)[i]
+            if any(d not in started for d in deps):
+                return
+            tc = calls[i]
+            fut: concurrent.futures.Future = concurrent.futures.Future()
+            before = [started[d] for d in deps]  # lane sin multiplexar: en serie igual
+            cancel = self._cancel
+
+            def _go():
+                concurrent.futures.wait(before)
+                try:
+                    with cancel_scope(cancel):
+                        fut.set_result(self._dispatch(tc))
+                except BaseException as e:
+                    fut.set_exception(e)
+            threading.Thread(target=_go, name=f"spec-{names[i]}", daemon=True).start()
+            started[i] = fut
+        return on_call
+
+    def _log_step(self, step: AgentStep):
+        self.log({
+            "event": "agent_step",
+            "step": step.step,
+            "llm_ms": round(step.llm_ms, 1),
+            "ttft_ms": None if step.ttft_ms is None else round(step.ttft_ms, 1),
+            "tools_ms": round(step.tools_ms, 1),
+            "tools": step.tools,
+            "speculated": step.speculated,
+            "prompt_tokens": step.prompt_tokens,
+            "completion_tokens": step.completion_tokens,
+        })
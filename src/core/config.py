@@ -2,9 +2,12 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
 from dotenv import load_dotenv
 
+from ..utils.jsonfmt import FORMATS
+
 APP_TITLE = "MCP Host • Consola"
 APP_VERSION = "1.0.0"
 
@@ -17,6 +20,32 @@ class AppSettings:
     openai_api_key: str
     openai_model: str = "gpt-4o-mini"
     log_path: str = "history/chat_log.jsonl"
+    tool_cache_path: str = ".cache/tool_catalog.json"
+    tool_top_k: int = 8   # tools por turno (0 = mandar todas)
+    agent_max_steps: int = 6
+    agent_token_budget: int = 16000
+    # Tools de sólo lectura que pueden correr mientras el modelo sigue en streaming
+    # (None = todas las readonly; vacío = desactivado)
+    speculative_tools: Optional[FrozenSet[str]] = None
+    cache_max_bytes: int = 16 * 1024 * 1024  # caché de resultados de tools (0 = desactivada)
+    tool_result_tokens: int = 1500  # tope por mensaje `tool`; lo demás se pagina (0 = sin recorte)
+    # Formato de los resultados para el modelo (markdown|tsv|csv|json): "*" = global, o por tool
+    result_formats: Dict[str, str] = field(default_factory=dict)
+    memory_tokens: int = 6000  # presupuesto del historial por sesión (0 = sin límite)
+    mcp_broker: bool = False  # servers stdio a través del broker local (src/mcp/broker.py)
+
+def _result_formats(spec: str) -> Dict[str, str]:
+    """'tsv' o 'markdown,sql_explain=csv,fs_list=tsv' → {"*": ..., tool: ...}."""
+    out: Dict[str, str] = {}
+    for item in (p.strip() for p in spec.split(",")):
+        if not item:
+            continue
+        tool, _, fmt = item.rpartition("=")
+        fmt = fmt.strip().lower()
+        if fmt not in FORMATS:
+            raise RuntimeError(f"HOST_RESULT_FORMAT: formato '{fmt}' inválido (usa {'|'.join(FORMATS)})")
+        out[tool.strip() or "*"] = fmt
+    return out
 
 def settings() -> AppSettings:
     load_dotenv()
@@ -31,6 +60,19 @@ def settings() -> AppSettings:
 
     model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     log_path = os.getenv("HOST_LOG_PATH", "history/chat_log.jsonl")
+    tool_cache_path = os.getenv("HOST_TOOL_CACHE", ".cache/tool_catalog.json")
+    tool_top_k = int(os.getenv("HOST_TOOL_TOP_K", "8"))
+    agent_max_steps = int(os.getenv("HOST_AGENT_MAX_STEPS", "6"))
+    agent_token_budget = int(os.getenv("HOST_AGENT_TOKEN_BUDGET", "16000"))
+    spec = os.getenv("HOST_SPECULATE", "readonly").strip()
+    speculative_tools = None if spec == "readonly" else (
+        frozenset() if spec in ("", "off") else frozenset(t.strip() for t in spec.split(",") if t.strip())
+    )
+    cache_max_bytes = int(float(os.getenv("HOST_CACHE_MB", "16")) * 1024 * 1024)
+    tool_result_tokens = int(os.getenv("HOST_TOOL_RESULT_TOKENS", "1500"))
+    result_formats = _result_formats(os.getenv("HOST_RESULT_FORMAT", "markdown"))
+    memory_tokens = int(os.getenv("HOST_MEMORY_TOKENS", "6000"))
+    mcp_broker = os.getenv("HOST_MCP_BROKER", "off").strip().lower() in ("1", "on", "true", "yes")
 
     return AppSettings(
         workspace_root=ws.rstrip("/\\"),
@@ -38,4 +80,14 @@ def settings() -> AppSettings:
         openai_api_key=api_key,
         openai_model=model,
         log_path=log_path,
+        tool_cache_path=tool_cache_path,
+        tool_top_k=tool_top_k,
+        agent_max_steps=agent_max_steps,
+        agent_token_budget=agent_token_budget,
+        speculative_tools=speculative_tools,
+        cache_max_bytes=cache_max_bytes,
+        tool_result_tokens=tool_result_tokens,
+        result_formats=result_formats,
+        memory_tokens=memory_tokens,
+        mcp_broker=mcp_broker,
     )
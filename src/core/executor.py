@@ -0,0 +1,92 @@
+# src/core/executor.py
+from __future__ import annotations
+
+import concurrent.futures, threading
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .registry import ToolRegistry
+from ..mcp.client import cancel_scope
+
+T = TypeVar("T")
+
+_MAX_WORKERS = 8
+
+
+def plan(registry: ToolRegistry, names: List[str]) -> List[List[int]]:
+    """
+    Dependencias de cada tool_call (índices anteriores que debe esperar). Las llamadas
+    se agrupan por `lane` (el servidor, o un dominio compartido como el workspace de
+    FS/Git). Dentro de un lane que no multiplexa todo va en serie; si multiplexa, las
+    lecturas corren juntas y cada escritura es una barrera (read-after-write).
+    Lanes distintos no se esperan entre sí.
+    """
+    deps: List[List[int]] = []
+    for i, name in enumerate(names):
+        lane, readonly, multiplex = _slot(registry, name)
+        mine: List[int] = []
+        for j in range(i):
+            other, other_ro, _ = _slot(registry, names[j])
+            if other == lane and (not multiplex or not (readonly and other_ro)):
+                mine.append(j)
+        deps.append(mine)
+    return deps
+
+
+def _slot(registry: ToolRegistry, name: str) -> Tuple[str, bool, bool]:
+    spec = registry.get(name)
+    if spec is None:  # no registrada: falla sola en dispatch, sin esperar a nadie
+        return f"?{name}", True, True
+    lane = spec.lane or spec.server
+    multiplex = lane == spec.server and registry.multiplex(spec.server)
+    return lane, spec.readonly, multiplex
+
+
+def run_tool_calls(
+    registry: ToolRegistry,
+    names: List[str],
+    fn: Callable[[int], T],
+    max_workers: int = _MAX_WORKERS,
+    started: Optional[Dict[int, "concurrent.futures.Future[T]"]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> List["concurrent.futures.Future[T]"]:
+    """
+    Ejecuta fn(0..n-1) en un pool de hilos respetando `plan`; devuelve los futures en el
+    orden original, así los mensajes `tool` conservan el orden de los tool_call_id.
+    La latencia del turno pasa a ser la del camino más largo y no la suma.
+    `started`: llamadas ya lanzadas (ejecución especulativa); no se repiten y las
+    demás las esperan como a cualquier dependencia.
+    `cancel`: al activarse, las llamadas en los hilos se cancelan (notifications/cancelled)
+    y las que aún no empezaron ya no salen; sus futures terminan con CancelledError.
+    """
+    n = len(names)
+    if n == 0:
+        return []
+    started = started or {}
+    deps = plan(registry, names)
+    futs: List[Optional[concurrent.futures.Future]] = [started.get(i) for i in range(n)]
+
+    def task(i: int) -> T:
+        # Las dependencias son siempre índices menores: ya se enviaron antes (cola FIFO)
+        for d in deps[i]:
+            concurrent.futures.wait([futs[d]])  # type: ignore[list-item]
+        if cancel is not None and cancel.is_set():
+            raise concurrent.futures.CancelledError()
+        with cancel_scope(cancel):
+            return fn(i)
+
+    if n == 1 and 0 in started:
+        return futs  # type: ignore[return-value]
+    if n == 1:
+        f: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            f.set_result(fn(0))
+        except BaseException as e:
+            f.set_exception(e)
+        return [f]
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(n, max_workers), thread_name_prefix="tool")
+    for i in range(n):
+        if futs[i] is None:
+            futs[i] = pool.submit(task, i)
+    pool.shutdown(wait=False)  # los hilos terminan solos al vaciarse la cola
+    return futs  # type: ignore[return-value]
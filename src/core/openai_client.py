@@ -1,10 +1,14 @@
 # src/core/openai_client.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Set, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from openai import OpenAI
 
 from .config import settings
+from .registry import LOCAL_SERVER, ToolHandler, ToolRegistry, ToolSpec, tool_error
+from .resultcache import ResultCache, norm_path
+from .shaping import PAGE_TOOL, PAGE_TOOL_DEF
+from .validate import schemas_by_name
 from ..mcp.client import MCPClient  # sólo para tipado
 
 
@@ -17,6 +21,27 @@ def build_openai_client():
     return client, cfg.openai_model
 
 
+def build_summarizer(client: Any, model: str, max_tokens: int = 400) -> Callable[[str, List[Dict[str, Any]]], str]:
+    """Resumen incremental para Memory (resumen previo + turnos viejos → nuevo); corre fuera del turno."""
+    def summarize(previous: str, messages: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
+        reply = client.chat.completions.create(
+            model=model,
+            temperature=0.2,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "system", "content": (
+                    "Resume la conversación para que un asistente pueda continuarla. Conserva hechos, "
+                    "decisiones, rutas de archivos, tablas, consultas SQL y resultados clave; omite saludos. "
+                    f"En viñetas, máximo ~{max_tokens * 3 // 4} palabras."
+                )},
+                {"role": "user", "content": f"Resumen previo:\n{previous or '(ninguno)'}\n\nTurnos nuevos:\n{transcript}"},
+            ],
+        )
+        return reply.choices[0].message.content or ""
+    return summarize
+
+
 # =========================
 # Mapeo SQL (SQLScout)
 # =========================
@@ -244,21 +269,14 @@ OPENAI_TOOLS: List[Dict[str, Any]] = [
             },
         },
     },
+    # Host
+    PAGE_TOOL_DEF,
 ]
 
 
 # =========================
 # Ejecutor de tools
 # =========================
-def _exec_sql(clients: Dict[str, MCPClient], tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
-    if "SQLScout" not in clients:
-        return {"content": [{"type": "text", "text": "Servidor 'SQLScout' no está configurado."}], "isError": True}
-    mcp_method = OPENAI_TO_MCP.get(tool_name)
-    if not mcp_method:
-        return {"content": [{"type": "text", "text": f"Tool '{tool_name}' no mapeada a SQLScout."}], "isError": True}
-    return clients["SQLScout"].call(mcp_method, args)
-
-
 def _ws_abs(rel: str) -> str:
     import os
     cfg = settings()
@@ -270,96 +288,150 @@ def _repo_root() -> str:
     return cfg.repo_root
 
 
-def handle_tool_call(
-    t_name: str,
-    args: Dict[str, Any],
-    clients: Dict[str, MCPClient],
-    remote_sitelens_names: Optional[Set[str]] = None,
-    remote_sitelens_map: Optional[Dict[str, str]] = None,
-    remote_anime_names: Optional[Set[str]] = None,
-    remote_anime_map: Optional[Dict[str, str]] = None,
-    remote_remote_names: Optional[Set[str]] = None,
-    remote_remote_map: Optional[Dict[str, str]] = None,
-) -> Dict[str, Any]:
-    """
-    remote_sitelens_names: nombres SEGUROS SiteLens (ej. 'sitelens__aa_sitemap')
-    remote_sitelens_map:   {safe -> 'aa.sitemap'}
-    remote_anime_names:    nombres SEGUROS AnimeHelper (ej. 'anime__search_media')
-    remote_anime_map:      {safe -> 'search_media'}
-    remote_remote_names:   nombres SEGUROS RemoteMCP (ej. 'remote__remote_ping')
-    remote_remote_map:     {safe -> 'remote.ping'}
-    """
-    remote_sitelens_names = remote_sitelens_names or set()
-    remote_sitelens_map = remote_sitelens_map or {}
-    remote_anime_names = remote_anime_names or set()
-    remote_anime_map = remote_anime_map or {}
-    remote_remote_names = remote_remote_names or set()
-    remote_remote_map = remote_remote_map or {}
-
-    # --- FS ---
-    if t_name == "fs_create_dir":
-        return clients["FS"].call("create_directory", {"path": _ws_abs(args["relative_path"])})
-    if t_name == "fs_write_text":
-        return clients["FS"].call("write_file", {"path": _ws_abs(args["relative_path"]), "content": args["content"]})
-    if t_name == "fs_read_text":
-        return clients["FS"].call("read_text_file", {"path": _ws_abs(args["relative_path"])})
-    if t_name == "fs_list":
-        return clients["FS"].call("list_directory", {"path": _ws_abs(args.get("relative_path", "."))})
-    if t_name == "fs_move":
-        return clients["FS"].call("move_file", {"source": _ws_abs(args["source"]), "destination": _ws_abs(args["destination"])})
-    if t_name == "fs_trash_delete":
-        import os, time
-        base = os.path.basename(args["relative_path"].replace("\\", "/"))
-        ts = time.strftime("%Y%m%d-%H%M%S")
-        trash_dir = _ws_abs(".trash")
-        clients["FS"].call("create_directory", {"path": trash_dir})
-        return clients["FS"].call("move_file", {
-            "source": _ws_abs(args["relative_path"]),
-            "destination": os.path.join(trash_dir, f"{ts}-{base}")
-        })
-
-    # --- Git ---
-    if t_name == "git_init_here":
-        return clients["Git"].call("git_init", {"repo_path": _repo_root()})
-    if t_name == "git_add_files":
-        BLOCKLIST_PREFIXES = (".git", "_git", "__pycache__")
-        BLOCKLIST_EXT = (".pyc", ".pyo", ".pyd", ".log")
-        safe: List[str] = []
-        for f in args.get("files", []):
-            rp = (f or "").replace("\\", "/").lstrip("/")
-            if (not rp) or any(rp.startswith(p) for p in BLOCKLIST_PREFIXES) or rp.endswith(BLOCKLIST_EXT):
-                continue
-            safe.append(rp)
-        if not safe:
-            return {"content": [{"type": "text", "text": "No hay archivos válidos para agregar."}], "isError": True}
-        return clients["Git"].call("git_add", {"repo_path": _repo_root(), "files": safe})
-    if t_name == "git_commit_msg":
-        return clients["Git"].call("git_commit", {"repo_path": _repo_root(), "message": args["message"]})
-    if t_name == "git_status_here":
-        return clients["Git"].call("git_status", {"repo_path": _repo_root()})
-    if t_name == "git_log_here":
-        return clients["Git"].call("git_log", {"repo_path": _repo_root(), "max_count": int(args.get("max_count", 5))})
-
-    # --- SiteLens (MCP local) ---
-    if t_name in remote_sitelens_names:
-        remote_name = remote_sitelens_map.get(t_name)
-        if not remote_name:
-            return {"content": [{"type": "text", "text": f"No se encontró mapeo para tool '{t_name}' de SiteLens."}], "isError": True}
-        return clients["SiteLens"].call(remote_name, args)
-
-    # --- AnimeHelper (MCP remoto/local) ---
-    if t_name in remote_anime_names:
-        remote_name = remote_anime_map.get(t_name)
-        if not remote_name:
-            return {"content": [{"type": "text", "text": f"No se encontró mapeo para tool '{t_name}' de anime-helper."}], "isError": True}
-        return clients["anime-helper"].call(remote_name, args)
-
-    # --- RemoteMCP (HTTP/WSS) ---
-    if t_name in remote_remote_names:
-        remote_name = remote_remote_map.get(t_name)
-        if not remote_name:
-            return {"content": [{"type": "text", "text": f"No se encontró mapeo para tool '{t_name}' de RemoteMCP."}], "isError": True}
-        return clients["RemoteMCP"].call(remote_name, args)
-
-    # --- SQL por defecto ---
-    return _exec_sql(clients, t_name, args)
+# --- FS ---
+def _fs_create_dir(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["FS"].call("create_directory", {"path": _ws_abs(args["relative_path"])})
+
+def _fs_write_text(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["FS"].call("write_file", {"path": _ws_abs(args["relative_path"]), "content": args["content"]})
+
+def _fs_read_text(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["FS"].call("read_text_file", {"path": _ws_abs(args["relative_path"])})
+
+def _fs_list(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["FS"].call("list_directory", {"path": _ws_abs(args.get("relative_path", "."))})
+
+def _fs_move(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["FS"].call("move_file", {"source": _ws_abs(args["source"]), "destination": _ws_abs(args["destination"])})
+
+def _fs_trash_delete(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    import os, time
+    base = os.path.basename(args["relative_path"].replace("\\", "/"))
+    ts = time.strftime("%Y%m%d-%H%M%S")
+    trash_dir = _ws_abs(".trash")
+    clients["FS"].call("create_directory", {"path": trash_dir})
+    return clients["FS"].call("move_file", {
+        "source": _ws_abs(args["relative_path"]),
+        "destination": os.path.join(trash_dir, f"{ts}-{base}")
+    })
+
+
+# --- Git ---
+def _git_init_here(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["Git"].call("git_init", {"repo_path": _repo_root()})
+
+def _git_add_files(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    BLOCKLIST_PREFIXES = (".git", "_git", "__pycache__")
+    BLOCKLIST_EXT = (".pyc", ".pyo", ".pyd", ".log")
+    safe: List[str] = []
+    for f in args.get("files", []):
+        rp = (f or "").replace("\\", "/").lstrip("/")
+        if (not rp) or any(rp.startswith(p) for p in BLOCKLIST_PREFIXES) or rp.endswith(BLOCKLIST_EXT):
+            continue
+        safe.append(rp)
+    if not safe:
+        return tool_error("No hay archivos válidos para agregar.")
+    return clients["Git"].call("git_add", {"repo_path": _repo_root(), "files": safe})
+
+def _git_commit_msg(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["Git"].call("git_commit", {"repo_path": _repo_root(), "message": args["message"]})
+
+def _git_status_here(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["Git"].call("git_status", {"repo_path": _repo_root()})
+
+def _git_log_here(clients: Dict[str, MCPClient], args: Dict[str, Any]) -> Dict[str, Any]:
+    return clients["Git"].call("git_log", {"repo_path": _repo_root(), "max_count": int(args.get("max_count", 5))})
+
+
+BUILTIN_TOOLS: Dict[str, Tuple[str, ToolHandler]] = {
+    "fs_create_dir": ("FS", _fs_create_dir),
+    "fs_write_text": ("FS", _fs_write_text),
+    "fs_read_text": ("FS", _fs_read_text),
+    "fs_list": ("FS", _fs_list),
+    "fs_move": ("FS", _fs_move),
+    "fs_trash_delete": ("FS", _fs_trash_delete),
+    "git_init_here": ("Git", _git_init_here),
+    "git_add_files": ("Git", _git_add_files),
+    "git_commit_msg": ("Git", _git_commit_msg),
+    "git_status_here": ("Git", _git_status_here),
+    "git_log_here": ("Git", _git_log_here),
+}
+
+# Sin efectos secundarios: pueden correr en paralelo con otras lecturas del mismo lane
+READONLY_TOOLS = {
+    "fs_read_text", "fs_list", "git_status_here", "git_log_here",
+    "sql_explain", "sql_diagnose", "sql_optimize",
+}
+# FS y Git ven el mismo árbol: comparten lane para no leer antes de una escritura
+WORKSPACE_LANE = "workspace"
+
+
+# --- Caché de resultados: TTL (s) de las lecturas y qué borra cada escritura ---
+CACHE_TTLS: Dict[str, float] = {
+    "fs_read_text": 30, "fs_list": 30,
+    "git_status_here": 30, "git_log_here": 60,
+    "sql_explain": 300, "sql_diagnose": 300, "sql_optimize": 300,
+}
+
+
+def _rel(path: Any) -> str:
+    return norm_path(path).strip("/") or "."
+
+
+def _under(base: str, path: str) -> bool:
+    return base == "." or path == base or path.startswith(base + "/")
+
+
+def _flush_fs(cache: ResultCache, args: Dict[str, Any], extra: Tuple[str, ...] = ()):
+    """Lecturas del path tocado (o de algo debajo si es carpeta), listados que lo contienen y git status."""
+    paths = [_rel(args[k]) for k in ("relative_path", "source", "destination") if isinstance(args.get(k), str)]
+    paths += list(extra)
+    cache.invalidate("fs_read_text", lambda a: any(_under(p, _rel(a.get("relative_path"))) for p in paths))
+    cache.invalidate("fs_list", lambda a: any(
+        _under(_rel(a.get("relative_path")), p) or _under(p, _rel(a.get("relative_path"))) for p in paths
+    ))
+    cache.invalidate("git_status_here")
+
+def _flush_trash(cache: ResultCache, args: Dict[str, Any]):
+    _flush_fs(cache, args, extra=(".trash",))
+
+def _flush_git(cache: ResultCache, args: Dict[str, Any]):
+    cache.invalidate("git_status_here")
+    cache.invalidate("git_log_here")
+
+def _flush_sql(cache: ResultCache, args: Dict[str, Any]):
+    for name in ("sql_explain", "sql_diagnose", "sql_optimize"):
+        cache.invalidate(name)
+
+
+INVALIDATES: Dict[str, Callable[[ResultCache, Dict[str, Any]], None]] = {
+    "fs_create_dir": _flush_fs, "fs_write_text": _flush_fs, "fs_move": _flush_fs, "fs_trash_delete": _flush_trash,
+    "git_init_here": _flush_git, "git_add_files": _flush_git, "git_commit_msg": _flush_git,
+    "sql_load": _flush_sql, "sql_apply": _flush_sql, "sql_optimize_apply": _flush_sql,
+}
+
+
+def build_registry(clients: Dict[str, MCPClient], cache: Optional[ResultCache] = None) -> ToolRegistry:
+    """Registro con los wrappers FS/Git/SQL; las tools remotas se agregan al importarlas."""
+    registry = ToolRegistry(clients, cache)
+    schemas = schemas_by_name(OPENAI_TOOLS)
+    for name, (server, handler) in BUILTIN_TOOLS.items():
+        registry.register(ToolSpec(
+            name=name, server=server, handler=handler, schema=schemas.get(name),
+            readonly=name in READONLY_TOOLS, lane=WORKSPACE_LANE,
+        ))
+    registry.register_remote("SQLScout", OPENAI_TO_MCP, schemas, READONLY_TOOLS)  # sql_* → sql.* (reenvío directo)
+    # Paginación de resultados recortados: la resuelve el Agent con el ResultShaper de la sesión
+    registry.register(ToolSpec(
+        name=PAGE_TOOL, server=LOCAL_SERVER, schema=PAGE_TOOL_DEF["function"]["parameters"], readonly=True,
+        handler=lambda _clients, _args: tool_error("No hay resultados guardados en esta sesión."),
+    ))
+    for spec in registry:
+        spec.ttl = CACHE_TTLS.get(spec.name, 0.0)
+        spec.invalidate = INVALIDATES.get(spec.name)
+    return registry
+
+
+def handle_tool_call(t_name: str, args: Dict[str, Any], registry: ToolRegistry) -> Dict[str, Any]:
+    """Despacha una tool por nombre seguro (lookup O(1) en el registro)."""
+    return registry.dispatch(t_name, args)
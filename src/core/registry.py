@@ -0,0 +1,144 @@
+# src/core/registry.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from .resultcache import ResultCache
+from .validate import ArgumentError, Validator, compile_validator
+
+# handler(clients, args) -> respuesta MCP
+ToolHandler = Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+
+
+LOCAL_SERVER = "host"  # tools que resuelve el propio host (sin servidor MCP detrás)
+
+
+def tool_error(text: str) -> Dict[str, Any]:
+    """Respuesta MCP de error (mismo formato que devuelven los servers)."""
+    return {"content": [{"type": "text", "text": text}], "isError": True}
+
+
+@dataclass
+class ToolSpec:
+    name: str                     # nombre seguro que ve OpenAI (p. ej. 'sitelens__aa_sitemap')
+    server: str                   # servidor MCP que atiende la tool
+    handler: ToolHandler
+    remote: Optional[str] = None  # tool real en el server, si es un reenvío directo
+    schema: Optional[Dict[str, Any]] = None  # `parameters` que ve OpenAI
+    readonly: bool = False        # no modifica estado: puede correr junto a otras lecturas
+    lane: Optional[str] = None    # dominio de orden compartido entre servers (default: server)
+    ttl: float = 0.0              # segundos en ResultCache (0 = no se cachea; solo si readonly)
+    # Regla de escritura: qué lecturas cacheadas borra (default si no es readonly: todo el server)
+    invalidate: Optional[Callable[[ResultCache, Dict[str, Any]], None]] = field(default=None, repr=False)
+    validate: Optional[Validator] = field(default=None, repr=False)
+
+
+class ToolRegistry:
+    """
+    Tabla nombre seguro → handler pre-ligado. Reemplaza la cadena de if/sets de
+    handle_tool_call: el despacho es un lookup de dict sin importar cuántos
+    servidores haya. Los wrappers FS/Git/SQL y las tools importadas registran aquí.
+    """
+
+    def __init__(self, clients: Dict[str, Any], cache: Optional[ResultCache] = None):
+        self.clients = clients
+        self.cache = cache
+        self._tools: Dict[str, ToolSpec] = {}
+
+    def register(self, spec: ToolSpec):
+        """Registra la tool; su `schema` se compila aquí una sola vez."""
+        if spec.validate is None and spec.schema is not None:
+            spec.validate = compile_validator(spec.name, spec.schema)
+        self._tools[spec.name] = spec
+
+    def register_remote(
+        self, server: str, mapping: Dict[str, str],
+        schemas: Optional[Dict[str, Dict[str, Any]]] = None, readonly: Iterable[str] = (),
+        ttls: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Registra reenvíos directos {safe -> remote} hacia `server`.
+        schemas: {safe -> parameters}; readonly: nombres seguros sin efectos secundarios;
+        ttls: {safe -> segundos en caché}.
+        """
+        schemas = schemas or {}
+        readonly = set(readonly)
+        ttls = ttls or {}
+        for safe, remote in mapping.items():
+            self.register(ToolSpec(
+                name=safe, server=server, handler=_forward(server, remote), remote=remote,
+                schema=schemas.get(safe), readonly=safe in readonly, ttl=ttls.get(safe, 0.0),
+            ))
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._tools.get(name)
+
+    def multiplex(self, server: str) -> bool:
+        """¿El cliente de `server` atiende varias llamadas a la vez? (ServerPool.multiplex)"""
+        if server == LOCAL_SERVER:
+            return True
+        return bool(getattr(self.clients.get(server), "multiplex", False))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self) -> Iterator[ToolSpec]:
+        return iter(list(self._tools.values()))
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def dispatch(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Valida (y completa defaults) antes de tocar el servidor; inválido → error local."""
+        spec = self._tools.get(name)
+        if spec is None:
+            return tool_error(f"Tool '{name}' no registrada.")
+        if spec.server not in self.clients and spec.server != LOCAL_SERVER:
+            return tool_error(f"Servidor '{spec.server}' no está configurado.")
+        if spec.validate is not None:
+            try:
+                args = spec.validate(args)
+            except ArgumentError as e:
+                return e.result()
+        cache = self.cache
+        if cache is None:
+            return spec.handler(self.clients, args)
+
+        if spec.readonly and spec.ttl > 0:  # solo lecturas: una tool que escribe nunca se memoiza
+            hit = cache.get(name, args)
+            if hit is not None:
+                return hit
+            gen = cache.generation(spec.server)  # antes de leer: una escritura en el medio la descarta
+            resp = spec.handler(self.clients, args)
+            cache.put(spec.server, name, args, resp, spec.ttl, gen=gen)
+            return resp
+        try:
+            return spec.handler(self.clients, args)
+        finally:
+            if not spec.readonly:
+                self.wrote(spec.server, spec, args)
+
+    def wrote(self, server: str, spec: Optional[ToolSpec] = None, args: Optional[Dict[str, Any]] = None):
+        """
+        Tras una escritura en `server` (también las de `:call`): sube la generación del
+        server y de los que comparten lane con él, y borra lo afectado (regla de la tool
+        o, sin regla, todo lo de esos servers).
+        """
+        cache = self.cache
+        if cache is None:
+            return
+        lanes = {t.lane for t in self._tools.values() if t.server == server and t.lane}
+        peers = {server} | {t.server for t in self._tools.values() if t.lane in lanes}
+        cache.bump(*peers)
+        if spec is not None and spec.invalidate is not None:
+            spec.invalidate(cache, args or {})
+        else:
+            for s in peers:
+                cache.invalidate_server(s)  # escritura sin regla: conservador
+
+
+def _forward(server: str, remote: str) -> ToolHandler:
+    def handler(clients: Dict[str, Any], args: Dict[str, Any]) -> Dict[str, Any]:
+        return clients[server].call(remote, args)
+    return handler
@@ -0,0 +1,154 @@
+# src/core/resultcache.py
+from __future__ import annotations
+
+import json, posixpath, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..utils import codec
+
+_Key = Tuple[str, str]  # (tool segura, args canónicos)
+
+
+@dataclass
+class _Entry:
+    server: str
+    args: Dict[str, Any]
+    value: Dict[str, Any]
+    size: int
+    expires: float
+
+
+# Argumentos que son rutas: se normalizan para que "./a.txt" y "a.txt" sean la misma clave
+_PATH_KEYS = ("relative_path", "source", "destination", "path")
+
+
+def norm_path(path: Any) -> str:
+    """'./a//b/', 'a\\b' → 'a/b'; vacío → '.'."""
+    return posixpath.normpath(str(path or ".").replace("\\", "/"))
+
+
+def _normalize(args: Dict[str, Any]) -> Dict[str, Any]:
+    if not any(isinstance(args.get(k), str) for k in _PATH_KEYS):
+        return args
+    return {k: norm_path(v) if k in _PATH_KEYS and isinstance(v, str) else v for k, v in args.items()}
+
+
+def _canonical(args: Dict[str, Any]) -> str:
+    return json.dumps(args, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class ResultCache:
+    """
+    Memoización de resultados de tools: clave (tool, args canónicos), TTL por tool y
+    expulsión LRU por tamaño total en bytes (`max_bytes`). Las escrituras invalidan
+    las lecturas afectadas (reglas en ToolSpec.invalidate o, por defecto, todo el
+    servidor). No guarda errores. Thread-safe: las tools corren en paralelo.
+    Cada servidor tiene una generación que sube con cada escritura/invalidación: una
+    lectura que empezó antes (`generation`) no se guarda si terminó después (`put(gen=…)`).
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[_Key, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0  # lecturas descartadas por una escritura concurrente
+        self._gens: Dict[str, int] = {}
+        self._epoch = 0  # sube con clear()
+
+    # ---- lectura / escritura ----
+    def get(self, tool: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = (tool, _canonical(_normalize(args)))
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None and e.expires <= time.monotonic():
+                self._drop(key)
+                e = None
+            if e is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return e.value
+
+    def put(
+        self, server: str, tool: str, args: Dict[str, Any], value: Dict[str, Any], ttl: float,
+        gen: Optional[Tuple[int, int]] = None,
+    ):
+        """`gen`: generation(server) tomada antes de la lectura; si cambió, no se guarda."""
+        if ttl <= 0 or value.get("isError") or "error" in value or (value.get("result") or {}).get("isError"):
+            return
+        size = len(codec.dumps(value))
+        if size > self.max_bytes:
+            return
+        args = _normalize(args)
+        key = (tool, _canonical(args))
+        with self._lock:
+            if gen is not None and gen != (self._epoch, self._gens.get(server, 0)):
+                self.stale += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(server, dict(args), value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: _Key):
+        e = self._entries.pop(key)
+        self._bytes -= e.size
+
+    # ---- invalidación ----
+    def generation(self, server: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._gens.get(server, 0)
+
+    def bump(self, *servers: str):
+        """Marca una escritura en `servers`: las lecturas en vuelo no se guardarán."""
+        with self._lock:
+            for s in servers:
+                self._gens[s] = self._gens.get(s, 0) + 1
+
+    def invalidate(self, tool: str, match: Optional[Callable[[Dict[str, Any]], bool]] = None) -> int:
+        """Borra las entradas de `tool` (sólo las cuyos args cumplen `match`, si se pasa)."""
+        return self._invalidate(lambda k, e: k[0] == tool and (match is None or match(e.args)))
+
+    def invalidate_server(self, server: str) -> int:
+        self.bump(server)
+        return self._invalidate(lambda k, e: e.server == server)
+
+    def clear(self) -> int:
+        with self._lock:
+            self._epoch += 1
+        return self._invalidate(lambda k, e: True)
+
+    def _invalidate(self, pred: Callable[[_Key, _Entry], bool]) -> int:
+        with self._lock:
+            doomed = [k for k, e in self._entries.items() if pred(k, e)]
+            for k in doomed:
+                self._drop(k)
+            self.invalidations += len(doomed)
+            return len(doomed)
+
+    # ---- métricas ----
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+            }
@@ -3,10 +3,15 @@ from __future__ import annotations
 from typing import Dict, Tuple, Optional, Any
 import json
 
+from rich.markup import escape
+
 from .ui import (
-    clear_screen, print_note, print_error, print_help, print_json
+    clear_screen, print_note, print_error, print_help, print_json,
+    start_thinking, stop_thinking
 )
+from .registry import ToolRegistry
 from ..utils.jsonfmt import table_from_result
+from ..utils import codec
 
 
 def _print_tool_response(resp: Dict[str, Any], raw_state: Optional[dict]) -> Optional[str]:
@@ -15,7 +20,7 @@ def _print_tool_response(resp: Dict[str, Any], raw_state: Optional[dict]) -> Opt
     '__RAW__<json>' para que el caller lo recuerde como 'último payload crudo'.
     """
     if raw_state and raw_state.get("enabled"):
-        return "__RAW__" + json.dumps(resp, ensure_ascii=False, indent=2)
+        return "__RAW__" + codec.dumps_str(resp, indent=True)
 
     # Normalizamos contenido “tabulable”
     payload = resp.get("result", resp) if isinstance(resp, dict) else resp
@@ -38,6 +43,7 @@ def handle_colon_commands(
     default_server: str,
     openai_tools: Optional[list] = None,
     raw_state: Optional[dict] = None,
+    registry: Optional[ToolRegistry] = None,
 ) -> Tuple[bool, Optional[str]]:
     """
     Procesa comandos enviados con prefijo ':'.
@@ -70,6 +76,44 @@ def handle_colon_commands(
         print_note(f"Modo RAW {'[ON]' if raw_state['enabled'] else '[OFF]'}")
         return True, None
 
+    cache = registry.cache if registry is not None else None
+
+    # --- :cache [clear]
+    if cmd == ":cache":
+        if cache is None:
+            print_error("Caché de tools desactivada (HOST_CACHE_MB=0).")
+            return True, None
+        if user.strip().split()[1:] == ["clear"]:
+            print_note(f"Caché vaciada ({cache.clear()} entradas).")
+            return True, None
+        s = cache.stats()
+        print_note(
+            f"Caché de tools: hit ratio {s['hit_ratio'] * 100:.1f}% ({s['hits']} hits / {s['misses']} misses) · "
+            f"{s['entries']} entradas · {s['bytes'] / 1024:.1f} / {s['max_bytes'] / 1024:.0f} KiB · "
+            f"{s['evictions']} expulsadas · {s['invalidations']} invalidadas · {s['stale']} descartadas (escritura en vuelo)"
+        )
+        return True, None
+
+    # --- :stderr <Server> [n]
+    if cmd == ":stderr":
+        parts = user.strip().split()
+        if len(parts) < 2:
+            print_error("Uso: :stderr <Servidor> [líneas]")
+            return True, None
+        server = parts[1]
+        if server not in clients:
+            print_error(f"Servidor '{server}' no está disponible. Usa :servers.")
+            return True, None
+        try:
+            last = int(parts[2]) if len(parts) > 2 else 40
+        except ValueError:
+            print_error("El número de líneas debe ser entero.")
+            return True, None
+        tail = getattr(clients[server], "stderr_text", None)
+        text = tail(last=last) if callable(tail) else ""
+        print_note(escape(text) if text else f"(sin salida en stderr de {server})")
+        return True, None
+
     # --- :call <Server> <tool> <json_args?>
     if cmd == ":call":
         parts = user.strip().split(maxsplit=3)
@@ -93,11 +137,23 @@ def handle_colon_commands(
             print_error(f"JSON inválido: {e}")
             return True, None
 
+        # Una tool que no está registrada como lectura puede escribir: invalida la caché
+        readonly = registry is not None and any(
+            spec.server == server and spec.remote == tool and spec.readonly for spec in registry
+        )
+        start_thinking(f"{server}.{tool}…")
         try:
             resp = clients[server].call(tool, args)
+        except KeyboardInterrupt:
+            print_note(f"Llamada a {server}.{tool} cancelada.")
+            return True, None
         except Exception as e:
             print_error(f"Error llamando {server}.{tool}: {e}")
             return True, None
+        finally:
+            stop_thinking()
+            if registry is not None and not readonly:
+                registry.wrote(server)
 
         extra = _print_tool_response(resp, raw_state)
         return True, extra
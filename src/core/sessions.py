@@ -0,0 +1,141 @@
+# src/core/sessions.py
+from __future__ import annotations
+
+import asyncio, concurrent.futures, time, uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple, TypeVar
+
+from .shaping import ResultShaper
+from .toolselect import ToolSelector
+from ..utils.memory import Memory
+
+T = TypeVar("T")
+
+
+@dataclass
+class Session:
+    id: str
+    memory: Memory
+    selector: ToolSelector          # por sesión: las tools "recientes" son de esta conversación
+    shaper: Optional[ResultShaper] = None  # resultados recortados (handles) de esta sesión
+    created: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.monotonic)
+    turns: int = 0
+
+
+class SessionStore:
+    """Sesiones del modo servidor: cada una con su Memory (ya con el mensaje de sistema)."""
+
+    def __init__(
+        self, make_selector: Callable[[], ToolSelector], system_prompt: str,
+        idle_ttl: float = 3600.0, max_sessions: int = 500,
+        make_memory: Callable[[], Memory] = Memory,
+        make_shaper: Optional[Callable[[], ResultShaper]] = None,
+    ):
+        self.make_selector = make_selector
+        self.make_memory = make_memory
+        self.make_shaper = make_shaper
+        self.system_prompt = system_prompt
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions: Dict[str, Session] = {}
+
+    def create(self) -> Session:
+        self.expire()
+        if len(self._sessions) >= self.max_sessions:
+            # sin lugar: se va la más inactiva
+            oldest = min(self._sessions.values(), key=lambda s: s.last_seen)
+            self.drop(oldest.id)
+        memory = self.make_memory()
+        memory.add("system", self.system_prompt)
+        s = Session(
+            id=uuid.uuid4().hex, memory=memory, selector=self.make_selector(),
+            shaper=self.make_shaper() if self.make_shaper else None,
+        )
+        self._sessions[s.id] = s
+        return s
+
+    def get(self, sid: str) -> Optional[Session]:
+        s = self._sessions.get(sid)
+        if s is not None:
+            s.last_seen = time.monotonic()
+        return s
+
+    def drop(self, sid: str) -> bool:
+        return self._sessions.pop(sid, None) is not None
+
+    def expire(self) -> int:
+        limit = time.monotonic() - self.idle_ttl
+        stale = [sid for sid, s in self._sessions.items() if s.last_seen < limit]
+        for sid in stale:
+            del self._sessions[sid]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class FairScheduler:
+    """
+    Reparte `slots` hilos de trabajo entre sesiones por turnos (round-robin): cada sesión
+    tiene su cola FIFO y como mucho un turno corriendo (la conversación es secuencial);
+    al terminar, la sesión vuelve al final de la ronda. Así una sesión con muchos
+    mensajes encolados no deja esperando a las demás.
+    Se usa desde un loop asyncio; el trabajo (bloqueante: OpenAI + MCP) va al `executor`.
+    """
+
+    def __init__(self, slots: int = 8):
+        self.slots = max(1, slots)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="turn")
+        self._queues: Dict[str, Deque[Tuple[Callable[[], Any], asyncio.Future]]] = {}
+        self._ready: Deque[str] = deque()   # sesiones con trabajo y sin turno corriendo
+        self._busy: Set[str] = set()
+        self.running = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def run(self, sid: str, fn: Callable[[], T]) -> T:
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(sid, deque()).append((fn, fut))
+        if sid not in self._busy and sid not in self._ready:
+            self._ready.append(sid)
+        self._pump()
+        return await fut
+
+    def _pump(self):
+        loop = asyncio.get_running_loop()
+        while self.running < self.slots and self._ready:
+            sid = self._ready.popleft()
+            q = self._queues.get(sid)
+            while q and q[0][1].cancelled():  # el cliente se fue antes de empezar
+                q.popleft()
+            if not q:
+                self._queues.pop(sid, None)
+                continue
+            fn, fut = q.popleft()
+            self._busy.add(sid)
+            self.running += 1
+            task = loop.run_in_executor(self.executor, fn)
+            task.add_done_callback(lambda t, sid=sid, fut=fut: self._finished(sid, fut, t))
+
+    def _finished(self, sid: str, fut: asyncio.Future, task: asyncio.Future):
+        self.running -= 1
+        self._busy.discard(sid)
+        if not fut.done():
+            if task.cancelled():
+                fut.cancel()
+            elif task.exception() is not None:
+                fut.set_exception(task.exception())  # type: ignore[arg-type]
+            else:
+                fut.set_result(task.result())
+        if self._queues.get(sid):
+            self._ready.append(sid)  # al final de la ronda
+        else:
+            self._queues.pop(sid, None)
+        self._pump()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,265 @@
+# src/core/shaping.py
+"""
+Recorte de resultados de tools antes de mandarlos al modelo. Si el texto de una tool
+pasa el presupuesto de tokens, se manda una vista acotada (primeras filas, columnas
+largas omitidas, total de filas) y el resultado completo queda del lado del host bajo
+un handle que el modelo puede paginar con la tool local `tool_result_page`.
+"""
+from __future__ import annotations
+
+import itertools, threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .registry import tool_error
+from ..utils import codec
+from ..utils.jsonfmt import columns_of, pick_format, row_encoder
+from ..utils.tokens import count_tokens
+
+PAGE_TOOL = "tool_result_page"
+
+PAGE_TOOL_DEF: Dict[str, Any] = {
+    "type": "function",
+    "function": {
+        "name": PAGE_TOOL,
+        "description": (
+            "Lee más de un resultado de tool que llegó truncado (usa el handle que indica el resultado): "
+            "más filas, columnas omitidas (columns) o el texto completo de una fila recortada (char_offset)."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "Handle del resultado truncado, p. ej. r1"},
+                "offset": {"type": "integer", "minimum": 0, "default": 0},
+                "limit": {"type": "integer", "minimum": 1, "maximum": 200, "default": 50},
+                "columns": {
+                    "type": "array", "items": {"type": "string"},
+                    "description": "Columnas a mostrar, incluidas las omitidas por largas (por defecto las de la vista inicial)",
+                },
+                "char_offset": {
+                    "type": "integer", "minimum": 0,
+                    "description": "Texto completo de la fila `offset` (o del contexto con context=true) desde este carácter",
+                },
+                "context": {"type": "boolean", "default": False, "description": "Con char_offset: lee el contexto de las filas"},
+            },
+            "required": ["handle"],
+        },
+    },
+}
+
+_CELL = 60          # caracteres máximos por celda en la vista de tabla
+_LINE = 400         # caracteres máximos por línea / fila en la vista
+_CONTEXT = 600      # caracteres máximos del contexto en la vista
+_WIDE = 120         # columnas con valores en promedio más largos que esto se omiten de la vista
+_FOOTER = 80        # tokens reservados para el pie
+_CHARS_PER_TOKEN = 3  # conservador: para trozos de texto con char_offset
+
+
+@dataclass
+class _Stored:
+    """Resultado completo, sin recortar: la vista recorta al renderizar."""
+    tool: str
+    kind: str                     # "rows" (lista de objetos/valores) | "lines" (texto)
+    rows: List[Any]
+    context: str = ""             # resto del objeto cuando las filas eran uno de sus campos
+    key: str = ""                 # campo del objeto que tenía las filas
+    columns: List[str] = field(default_factory=list)      # las de la vista por defecto
+    all_columns: List[str] = field(default_factory=list)  # todas, en orden de aparición
+    fmt: str = "markdown"           # formato de las filas (ver jsonfmt.FORMATS)
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else codec.dumps_str(value)
+
+
+def _clip(value: Any, n: int) -> Tuple[str, bool]:
+    """(texto en una línea acotado a `n`, si se recortó)."""
+    s = " ".join(_text(value).split())
+    return (s, False) if len(s) <= n else (s[: n - 1] + "…", True)
+
+
+def _cell(value: Any) -> Tuple[Any, bool]:
+    """Celda acotada; números/bools/null quedan tal cual (importa en formato json)."""
+    if value is None or isinstance(value, (int, float)):
+        return value, False
+    return _clip(value, _CELL)
+
+
+def _extract(resp: Dict[str, Any], rendered: str) -> Tuple[str, List[Any], str, str]:
+    """(kind, filas, contexto, campo) de una respuesta MCP: la lista de structuredContent si hay una."""
+    result = resp.get("result", resp)
+    result = result if isinstance(result, dict) else {}
+    sc = result.get("structuredContent")
+    data = sc.get("result", sc) if isinstance(sc, dict) else None
+    if isinstance(data, list) and len(data) > 1:
+        return "rows", data, "", ""
+    if isinstance(data, dict):
+        lists = [k for k, v in data.items() if isinstance(v, list) and len(v) > 1]
+        if lists:
+            key = max(lists, key=lambda k: len(data[k]))
+            rest = {k: v for k, v in data.items() if k != key}
+            return "rows", data[key], (codec.dumps_str(rest) if rest else ""), key
+    return "lines", rendered.splitlines(), "", ""
+
+
+def _columns(rows: List[Any]) -> Tuple[List[str], List[str]]:
+    """(columnas de la vista por defecto, todas las columnas), en orden de aparición."""
+    cols = columns_of(rows)
+    sample = [r for r in rows[:50] if isinstance(r, dict)]
+    if not cols or not sample:
+        return cols, cols
+    width = {c: sum(len(_text(r.get(c, ""))) for r in sample) / len(sample) for c in cols}
+    keep = [c for c in cols if width[c] <= _WIDE]
+    if len(keep) < 2:
+        keep = sorted(cols, key=lambda c: width[c])[:2]
+        keep = [c for c in cols if c in keep]
+    return keep, cols
+
+
+def _numbers(xs: List[int], n: int = 5) -> str:
+    return ", ".join(str(x) for x in xs[:n]) + ("…" if len(xs) > n else "")
+
+
+class ResultShaper:
+    """
+    Por sesión: recorta resultados a `budget` tokens y guarda los completos (LRU de
+    `max_results` handles) para `tool_result_page`. Las filas salen en el formato de
+    la tool según `formats` (como HOST_RESULT_FORMAT; markdown por defecto). Lo que la
+    vista omite (filas, columnas largas, texto de celdas/líneas) sigue guardado y el
+    pie dice cómo pedirlo.
+    """
+
+    def __init__(self, budget: int = 1500, max_results: int = 32, formats: Optional[Dict[str, str]] = None):
+        self.budget = budget
+        self.max_results = max_results
+        self.formats = formats or {}
+        self._store: "OrderedDict[str, _Stored]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def shape(self, tool: str, resp: Dict[str, Any], rendered: str) -> Tuple[str, Optional[str]]:
+        """(texto para el modelo, handle si se recortó)."""
+        if self.budget <= 0 or tool == PAGE_TOOL or count_tokens(rendered) <= self.budget:
+            return rendered, None
+        kind, rows, context, key = _extract(resp, rendered)
+        entry = _Stored(tool=tool, kind=kind, rows=rows, context=context, key=key, fmt=pick_format(self.formats, tool))
+        if kind == "rows":
+            entry.columns, entry.all_columns = _columns(rows)
+        with self._lock:
+            handle = f"r{next(self._ids)}"
+            self._store[handle] = entry
+            while len(self._store) > self.max_results:
+                self._store.popitem(last=False)
+        return self._render(handle, entry, 0, len(rows), entry.columns), handle
+
+    def page(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        handle = str(args.get("handle", ""))
+        with self._lock:
+            entry = self._store.get(handle)
+            if entry is not None:
+                self._store.move_to_end(handle)
+        if entry is None:
+            return tool_error(f"Handle '{handle}' desconocido o expirado; vuelve a llamar a la tool original.")
+        try:
+            offset = max(0, int(args.get("offset", 0)))
+            limit = min(200, max(1, int(args.get("limit", 50))))
+            chars = args.get("char_offset")
+            chars = None if chars is None else max(0, int(chars))
+        except (TypeError, ValueError):
+            return tool_error("offset, limit y char_offset deben ser enteros.")
+        columns = args.get("columns") or entry.columns
+        if not isinstance(columns, list):
+            return tool_error("columns debe ser una lista de nombres de columna.")
+        unknown = [c for c in columns if c not in entry.all_columns]
+        if unknown:
+            return tool_error(f"Columnas desconocidas: {', '.join(map(str, unknown))}. Disponibles: {', '.join(entry.all_columns) or '(ninguna)'}")
+        if chars is not None and not args.get("context") and offset >= len(entry.rows):
+            return tool_error(f"offset {offset} fuera de rango: el resultado tiene {len(entry.rows)} filas.")
+        if chars is not None:
+            text = self._chars(handle, entry, offset, chars, columns if args.get("columns") else None, bool(args.get("context")))
+        else:
+            text = self._render(handle, entry, offset, limit, columns)
+        return {"content": [{"type": "text", "text": text}]}
+
+    def _render(self, handle: str, entry: _Stored, offset: int, limit: int, columns: List[str]) -> str:
+        """Filas desde `offset` (hasta `limit`) que entran en el presupuesto, con pie de paginación."""
+        total = len(entry.rows)
+        lines: List[str] = []
+        used = _FOOTER
+        context_clipped = False
+        if offset == 0 and entry.context:
+            context, context_clipped = _clip(entry.context, _CONTEXT)
+            lines.append(context)
+            used += count_tokens(context)
+        if entry.key:
+            lines.append(f"{entry.key}:")
+        if entry.kind == "rows" and columns:
+            head, encode = row_encoder(entry.fmt, columns)
+            lines += head
+            used += count_tokens("\n".join(head))
+
+        shown = 0
+        clipped: List[int] = []
+        for i, row in enumerate(entry.rows[offset:offset + limit], offset):
+            if entry.kind == "lines":
+                cut = len(row) > _LINE
+                line = row[: _LINE - 1] + "…" if cut else row
+            elif columns and isinstance(row, dict):
+                cells = {c: _cell(row[c]) for c in columns if c in row}
+                cut = any(was for _v, was in cells.values())
+                line = encode({c: v for c, (v, _was) in cells.items()})
+            else:
+                line, cut = _clip(row, _LINE)
+                line = "- " + line
+            cost = count_tokens(line) + 1
+            if shown and used + cost > self.budget:
+                break
+            lines.append(line)
+            used += cost
+            shown += 1
+            if cut:
+                clipped.append(i)
+
+        end = offset + shown
+        unit = "líneas" if entry.kind == "lines" else "filas"
+        note = f"[{entry.tool}: {unit} {offset + 1}–{end} de {total}" if shown else f"[{entry.tool}: sin {unit} desde {offset}, total {total}"
+        omitted = [c for c in entry.all_columns if c not in columns]
+        if omitted:
+            note += f"; columnas omitidas: {', '.join(omitted)} (pídelas con columns=[...])"
+        if clipped:
+            note += (
+                f"; {unit} recortadas (índice desde 0): {_numbers(clipped)} "
+                f'(texto completo con {PAGE_TOOL}(handle="{handle}", offset=<índice>, char_offset=0))'
+            )
+        if context_clipped:
+            note += f'; contexto recortado (completo con {PAGE_TOOL}(handle="{handle}", context=true, char_offset=0))'
+        if end < total:
+            note += f'. Más con {PAGE_TOOL}(handle="{handle}", offset={end}, limit={min(limit, 50)})]'
+        elif omitted or clipped or context_clipped:
+            note += ". No hay más filas, pero la vista omitió lo indicado]"
+        else:
+            note += ". Fin del resultado]"
+        return "\n".join(lines + [note])
+
+    def _chars(
+        self, handle: str, entry: _Stored, index: int, start: int,
+        columns: Optional[List[str]], context: bool,
+    ) -> str:
+        """Texto completo de una fila (todas sus columnas, o las pedidas) o del contexto, por trozos de caracteres."""
+        if context:
+            what, text = "contexto", entry.context
+        else:
+            row = entry.rows[index]
+            if columns and isinstance(row, dict):
+                row = {c: row[c] for c in columns if c in row}
+            what, text = f"{'línea' if entry.kind == 'lines' else 'fila'} {index}", _text(row)
+        size = max(200, (self.budget - _FOOTER) * _CHARS_PER_TOKEN)
+        end = min(len(text), start + size)
+        note = f"[{entry.tool}: {what}, caracteres {start}–{end} de {len(text)}"
+        if end < len(text):
+            rest = ", context=true" if context else f", offset={index}"
+            note += f'. Más con {PAGE_TOOL}(handle="{handle}"{rest}, char_offset={end})]'
+        else:
+            note += "]"
+        return "\n".join([text[start:end], note])
@@ -0,0 +1,191 @@
+# src/core/toolselect.py
+from __future__ import annotations
+
+import math, re, unicodedata
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .registry import ToolRegistry
+
+# Palabras vacías ES/EN que no ayudan a elegir tool
+_STOP = {
+    "a", "al", "and", "con", "de", "del", "el", "en", "es", "esa", "ese", "eso", "esta", "este",
+    "for", "in", "la", "las", "lo", "los", "me", "mi", "of", "on", "or", "para", "por", "porfavor",
+    "que", "se", "si", "sin", "su", "the", "to", "tu", "un", "una", "usa", "usando", "y", "o",
+    "puedes", "podrias", "favor", "dame", "damelo", "hazlo", "muestrame", "muestralo", "luego",
+}
+
+# Sinónimos frecuentes (raíz → raíz que aparece en las descripciones)
+_ALIAS = {
+    "borr": "elimin", "delet": "elimin", "remov": "elimin",
+    "renomb": "muev", "renam": "muev", "mov": "muev",
+    "fold": "carpet", "direct": "carpet",
+    "guard": "escrib", "writ": "escrib", "sav": "escrib",
+    "leer": "lee", "read": "lee", "abr": "lee",
+    "query": "consul", "select": "consul",
+    "creat": "cre", "tabl": "sql", "table": "sql", "indice": "index",
+}
+
+
+def _stem(tok: str) -> str:
+    """Raíz tosca ES/EN: quita una terminación común y corta a 6 letras."""
+    for suf in ("ando", "iendo", "ar", "er", "ir", "as", "es", "os", "a", "e", "o", "s"):
+        if tok.endswith(suf) and len(tok) - len(suf) >= 3:
+            tok = tok[: -len(suf)]
+            break
+    tok = tok[:6]
+    return _ALIAS.get(tok, tok)
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return [_stem(t) for t in re.split(r"[^a-z0-9]+", text) if t and t not in _STOP and len(t) > 1]
+
+
+def _tool_text(tool: Dict[str, Any], server: str) -> str:
+    fn = tool.get("function", {})
+    props = (fn.get("parameters") or {}).get("properties") or {}
+    parts = [fn.get("name", ""), fn.get("description", ""), server]
+    for key, spec in props.items():
+        parts.append(key)
+        if isinstance(spec, dict):
+            parts.append(str(spec.get("description", "")))
+    return " ".join(parts)
+
+
+class ToolSelector:
+    """
+    Ranking local (BM25) de OPENAI_TOOLS para mandar sólo el top-k relevante en cada
+    paso. Documento = nombre + descripción + parámetros + nombre del servidor. El
+    subconjunto siempre trae al menos `top_k` tools: las mejor rankeadas, sus hermanas
+    del/los servidor(es) ganador(es) (los que llegan a `sibling_ratio` del mejor puntaje),
+    las usadas en los últimos turnos (con boost) y, si falta, relleno por ranking.
+    Confianza baja → lista completa: el mejor puntaje no llega a `min_score` o no se
+    despega del resto (menos de `spread` desviaciones sobre la media, p. ej. "hazlo
+    porfavor"). Mencionar un servidor ("Con SiteLens…") incluye todas sus tools. El
+    índice se rehace solo si OPENAI_TOOLS cambia de tamaño.
+    """
+
+    def __init__(
+        self,
+        tools: List[Dict[str, Any]],
+        registry: Optional[ToolRegistry] = None,
+        top_k: int = 8,
+        min_score: float = 2.0,
+        spread: float = 2.0,
+        sibling_ratio: float = 0.8,
+        recent: int = 6,
+        boost: float = 1.5,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.tools = tools
+        self.registry = registry
+        self.top_k = top_k
+        self.min_score = min_score
+        self.spread = spread
+        self.sibling_ratio = sibling_ratio
+        self.boost = boost
+        self.k1, self.b = k1, b
+        self._recent: Deque[str] = deque(maxlen=recent)
+        self._indexed = -1
+        self._docs: List[Counter] = []
+        self._lens: List[int] = []
+        self._idf: Dict[str, float] = {}
+        self._avg = 1.0
+        self._servers: Dict[str, List[int]] = {}  # raíz del nombre del server → tools
+        self._server_ix: List[str] = []           # server de cada tool
+
+    # ---- índice ----
+    def _server_of(self, name: str) -> str:
+        spec = self.registry.get(name) if self.registry is not None else None
+        return spec.server if spec else name.split("__", 1)[0].split("_", 1)[0]
+
+    def _index(self, tools: List[Dict[str, Any]]):
+        """Índice de `tools` (una copia fija: OPENAI_TOOLS puede crecer en otro hilo con --lazy)."""
+        self._docs, self._lens, self._servers, self._server_ix = [], [], {}, []
+        df: Counter = Counter()
+        for i, t in enumerate(tools):
+            name = t.get("function", {}).get("name", "")
+            server = self._server_of(name)
+            self._server_ix.append(server)
+            doc = Counter(tokenize(_tool_text(t, server)))
+            self._docs.append(doc)
+            self._lens.append(sum(doc.values()))
+            df.update(doc.keys())
+            for key in tokenize(server):
+                self._servers.setdefault(key, []).append(i)
+        n = len(tools)
+        self._avg = (sum(self._lens) / n) if n else 1.0
+        self._idf = {w: math.log(1 + (n - f + 0.5) / (f + 0.5)) for w, f in df.items()}
+        self._indexed = n
+
+    # ---- API ----
+    def record(self, name: str):
+        """Anota una tool usada (boost en los próximos turnos)."""
+        if name in self._recent:
+            self._recent.remove(name)
+        self._recent.append(name)
+
+    def scores(self, text: str, tools: Optional[List[Dict[str, Any]]] = None) -> List[Tuple[float, int]]:
+        """(puntaje, índice en `tools`) por tool; `tools` por defecto: una copia de self.tools."""
+        tools = list(self.tools) if tools is None else tools
+        if self._indexed != len(tools):
+            self._index(tools)
+        query = tokenize(text)
+        out: List[Tuple[float, int]] = []
+        for i, doc in enumerate(self._docs[: len(tools)]):
+            s = 0.0
+            for w in query:
+                f = doc.get(w)
+                if f:
+                    s += self._idf[w] * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * self._lens[i] / self._avg))
+            out.append((s, i))
+        return out
+
+    def select(self, text: str) -> List[Dict[str, Any]]:
+        """Tools para `text` (al menos top-k), o la lista completa si la confianza es baja."""
+        tools = list(self.tools)
+        if self.top_k <= 0 or len(tools) <= self.top_k:
+            return tools
+        scored = self.scores(text, tools)  # todos los índices son de esta copia
+        if not scored:
+            return tools
+        raw = [s for s, _ in scored]
+        best = max(raw)
+        mean = sum(raw) / len(raw)
+        std = math.sqrt(sum((s - mean) ** 2 for s in raw) / len(raw))
+        if best < max(self.min_score, mean + self.spread * std):
+            return tools
+
+        # Boost por uso reciente (más reciente → más peso)
+        pos = {name: k + 1 for k, name in enumerate(self._recent)}
+        ranked = []
+        for s, i in scored:
+            name = tools[i].get("function", {}).get("name", "")
+            if s > 0 and name in pos:
+                s += self.boost * pos[name] / len(self._recent)
+            ranked.append((s, i))
+        ranked.sort(key=lambda x: -x[0])
+
+        keep = [i for s, i in ranked[: self.top_k] if s > 0]
+        # Hermanas del/los servidor(es) ganador(es): el modelo suele encadenarlas
+        top: Dict[str, float] = {}
+        for s, i in ranked:
+            top.setdefault(self._server_ix[i], s)
+        for s, i in ranked:
+            if top[self._server_ix[i]] >= self.sibling_ratio * best:
+                keep.append(i)
+        for w in set(tokenize(text)):  # servidor mencionado explícitamente
+            keep.extend(self._servers.get(w, []))
+        # Las usadas en los últimos turnos siempre van (follow-ups tipo "ahora con 10 datos")
+        keep.extend(i for i, t in enumerate(tools) if t.get("function", {}).get("name") in pos)
+        seen: set = set()
+        keep = [i for i in keep if not (i in seen or seen.add(i))]
+        for _s, i in ranked:  # relleno hasta top-k
+            if len(keep) >= self.top_k:
+                break
+            if i not in seen:
+                seen.add(i)
+                keep.append(i)
+        return [tools[i] for i in keep]
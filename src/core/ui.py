@@ -4,6 +4,7 @@ from __future__ import annotations
 from typing import Dict, List, Optional, Union
 import json
 import contextlib
+from concurrent.futures import ThreadPoolExecutor
 
 from rich.console import Console
 from rich.panel import Panel
@@ -12,6 +13,7 @@ from rich.theme import Theme
 from rich.align import Align
 from rich.prompt import Prompt
 from rich.status import Status
+from rich.live import Live
 
 # ---------- Consola y tema ----------
 _theme = Theme(
@@ -31,8 +33,10 @@ _theme = Theme(
 )
 console = Console(theme=_theme)
 
-# ---------- Estado global del spinner ----------
+# ---------- Estado global del spinner / panel en vivo ----------
 _ACTIVE_STATUS: Optional[Status] = None
+_ACTIVE_LIVE: Optional[Live] = None
+_LIVE_TEXT = ""
 
 # ---------- Utilidades visuales ----------
 def _panel(title: str, body: str) -> Panel:
@@ -73,7 +77,9 @@ def print_help() -> None:
         "[b]:help[/b] — esta ayuda\n"
         "[b]:servers[/b] — servidores conectados y tools\n"
         "[b]:tools[/b] — alias de :servers\n"
+        "[b]:stderr <Servidor> [n][/b] — últimas n líneas de stderr del servidor\n"
         "[b]:raw[/b] — alterna mostrar JSON crudo del último resultado de tool\n"
+        "[b]:cache [clear][/b] — estadísticas (hit ratio) o vaciado de la caché de tools\n"
         "[b]:clear[/b] — limpia la pantalla\n"
         "[b]:quit[/b] — salir"
     )
@@ -83,25 +89,49 @@ def print_help() -> None:
 def print_servers_table(clients: Dict[str, object], ok: List[str], fail: List[str]) -> None:
     table = Table(title="Servidores MCP", title_style="subtitle", expand=True, show_lines=True)
     table.add_column("Servidor", style="title", no_wrap=True)
+    table.add_column("Conexión", style="dim", no_wrap=True)
+    table.add_column("Estado", style="dim", no_wrap=True)
     table.add_column("Tools", style="dim")
 
+    # tools/list de todos los conectados en paralelo (los lazy no se tocan)
+    live = [n for n in ok if getattr(clients[n], "connected", True)]
+
+    def _list(name: str):
+        try:
+            return clients[name].list_tools()  # type: ignore[attr-defined]
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, len(live))) as pool:
+        listed = dict(zip(live, pool.map(_list, live)))
+
     # Conectados (ok)
     for name in ok:
+        client = clients[name]
+        if name not in listed:
+            table.add_row(f"[warn]{name}[/warn]", "lazy", "-", "[dim](se conecta en la primera llamada)[/dim]")
+            continue
+        secs = getattr(client, "connect_time", None)
+        took = f"{secs:.2f} s" if isinstance(secs, (int, float)) else "-"
+        status = getattr(client, "status", None)
+        state = status() if callable(status) else "-"
         try:
-            resp = clients[name].list_tools()  # type: ignore[attr-defined]
+            resp = listed[name]
+            if isinstance(resp, Exception):
+                raise resp
             tools = resp.get("result", {}).get("tools", [])
             names = ", ".join(sorted(t.get("name") for t in tools if isinstance(t, dict)))
-            table.add_row(f"[ok]{name}[/ok]", names or "-")
+            table.add_row(f"[ok]{name}[/ok]", took, state, names or "-")
         except Exception as e:
-            table.add_row(f"[warn]{name}[/warn]", f"[warn]Error listando tools: {e}[/warn]")
+            table.add_row(f"[warn]{name}[/warn]", took, state, f"[warn]Error listando tools: {e}[/warn]")
 
     # Fallidos
     for entry in fail:
         if "→" in entry:
             server, err = entry.split("→", 1)
-            table.add_row(f"[error]{server.strip()}[/error]", f"[error]{err.strip()}[/error]")
+            table.add_row(f"[error]{server.strip()}[/error]", "-", "-", f"[error]{err.strip()}[/error]")
         else:
-            table.add_row(f"[error]{entry}[/error]", "-")
+            table.add_row(f"[error]{entry}[/error]", "-", "-", "-")
 
     console.print(table)
 
@@ -159,6 +189,17 @@ def start_thinking(text: str = "Pensando...") -> None:
     # Status es un context manager; para usarlo imperativamente, llamamos .start()
     _ACTIVE_STATUS.start()
 
+def update_thinking(text: str) -> None:
+    """Cambia el texto del spinner activo (p. ej. progreso que reporta una tool)."""
+    if _ACTIVE_LIVE is not None:
+        _ACTIVE_LIVE.update(_stream_panel(_LIVE_TEXT, text))
+        return
+    if _ACTIVE_STATUS is not None:
+        try:
+            _ACTIVE_STATUS.update(f"[dim]{text}[/dim]")
+        except Exception:
+            pass
+
 def stop_thinking() -> None:
     global _ACTIVE_STATUS
     if _ACTIVE_STATUS is not None:
@@ -168,6 +209,42 @@ def stop_thinking() -> None:
             pass
         _ACTIVE_STATUS = None
 
+# ---------- Respuesta en streaming ----------
+def _stream_panel(text: str, status: str = "") -> Panel:
+    return Panel(
+        Align.left(text or "…"),
+        title="[assistant]Asistente[/assistant]",
+        subtitle=f"[dim]{status}[/dim]" if status else None,
+        border_style="cyan",
+    )
+
+def stream_assistant(text: str) -> None:
+    """
+    Muestra `text` (respuesta parcial acumulada) en un panel vivo; la primera llamada
+    apaga el spinner y abre el panel. Cerrar con end_stream().
+    """
+    global _ACTIVE_LIVE, _LIVE_TEXT
+    _LIVE_TEXT = text
+    if _ACTIVE_LIVE is None:
+        stop_thinking()
+        _ACTIVE_LIVE = Live(_stream_panel(text), console=console, refresh_per_second=15, transient=False)
+        _ACTIVE_LIVE.start()
+    else:
+        _ACTIVE_LIVE.update(_stream_panel(text))
+
+def end_stream(text: Optional[str] = None) -> bool:
+    """Cierra el panel vivo dejando `text` como versión final. False si no había stream."""
+    global _ACTIVE_LIVE, _LIVE_TEXT
+    if _ACTIVE_LIVE is None:
+        return False
+    try:
+        _ACTIVE_LIVE.update(_stream_panel(_LIVE_TEXT if text is None else text))
+        _ACTIVE_LIVE.stop()
+    finally:
+        _ACTIVE_LIVE = None
+        _LIVE_TEXT = ""
+    return True
+
 # ---------- Alias para importar limpio ----------
 __all__ = [
     "banner",
@@ -182,5 +259,8 @@ __all__ = [
     "print_json",
     "thinking_spinner",
     "start_thinking",
+    "update_thinking",
     "stop_thinking",
+    "stream_assistant",
+    "end_stream",
 ]
@@ -0,0 +1,204 @@
+# src/core/validate.py
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional
+
+from ..utils import codec
+
+# check(valor, ruta, errores) -> valor normalizado (con defaults)
+_Check = Callable[[Any, str, List[Dict[str, str]]], Any]
+Validator = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+class ArgumentError(ValueError):
+    """Argumentos inválidos para una tool; `errors` = [{"path", "message"}]."""
+
+    def __init__(self, tool: str, errors: List[Dict[str, str]]):
+        self.tool = tool
+        self.errors = errors
+        super().__init__(f"{tool}: " + "; ".join(f"{e['path']}: {e['message']}" for e in errors))
+
+    def result(self) -> Dict[str, Any]:
+        """Respuesta MCP de error que el modelo puede leer y corregir en el siguiente intento."""
+        lines = "\n".join(f"- {e['path']}: {e['message']}" for e in self.errors)
+        return {
+            "content": [{"type": "text", "text": f"Argumentos inválidos para '{self.tool}' (no se ejecutó):\n{lines}"}],
+            "structuredContent": {"tool": self.tool, "errors": self.errors},
+            "isError": True,
+        }
+
+
+def parse_arguments(tool: str, raw: Optional[str]) -> Dict[str, Any]:
+    """`function.arguments` del modelo → dict; JSON roto o no-objeto → ArgumentError."""
+    if not raw or not raw.strip():
+        return {}
+    try:
+        args = codec.loads(raw)
+    except ValueError as e:
+        raise ArgumentError(tool, [{"path": "$", "message": f"JSON inválido ({e})"}])
+    if not isinstance(args, dict):
+        raise ArgumentError(tool, [{"path": "$", "message": "se esperaba un objeto JSON"}])
+    return args
+
+
+def _compile(schema: Any) -> _Check:
+    """Compila un subconjunto de JSON Schema (lo que usan nuestras tools) a una closure."""
+    if not isinstance(schema, dict):
+        return lambda v, path, errors: v
+
+    checks: List[_Check] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        preds = [_TYPES[t] for t in names if t in _TYPES]
+        if preds:
+            label = "|".join(names)
+
+            def check_type(v, path, errors, preds=preds, label=label):
+                if not any(p(v) for p in preds):
+                    # 3.0 → 3 si se pidió integer
+                    if "integer" in names and isinstance(v, float) and v.is_integer():
+                        return int(v)
+                    errors.append({"path": path, "message": f"se esperaba {label}, llegó {type(v).__name__}"})
+                return v
+            checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(v, path, errors):
+            if v not in allowed:
+                errors.append({"path": path, "message": f"debe ser uno de {allowed}"})
+            return v
+        checks.append(check_enum)
+
+    lo, hi = schema.get("minimum"), schema.get("maximum")
+    if lo is not None or hi is not None:
+        def check_range(v, path, errors):
+            if _TYPES["number"](v):
+                if lo is not None and v < lo:
+                    errors.append({"path": path, "message": f"debe ser ≥ {lo}"})
+                if hi is not None and v > hi:
+                    errors.append({"path": path, "message": f"debe ser ≤ {hi}"})
+            return v
+        checks.append(check_range)
+
+    for key, kind in (("minLength", str), ("minItems", list)):
+        if key in schema:
+            n = schema[key]
+
+            def check_min(v, path, errors, n=n, kind=kind):
+                if isinstance(v, kind) and len(v) < n:
+                    errors.append({"path": path, "message": f"longitud mínima {n}"})
+                return v
+            checks.append(check_min)
+
+    for key, kind in (("maxLength", str), ("maxItems", list)):
+        if key in schema:
+            n = schema[key]
+
+            def check_max(v, path, errors, n=n, kind=kind):
+                if isinstance(v, kind) and len(v) > n:
+                    errors.append({"path": path, "message": f"longitud máxima {n}"})
+                return v
+            checks.append(check_max)
+
+    alts = schema.get("anyOf") or schema.get("oneOf")
+    if isinstance(alts, list) and alts:
+        subs = [_compile(s) for s in alts]
+
+        def check_any(v, path, errors):
+            for sub in subs:
+                errs: List[Dict[str, str]] = []
+                out = sub(v, path, errs)
+                if not errs:
+                    return out
+            errors.append({"path": path, "message": "no coincide con ninguna variante permitida"})
+            return v
+        checks.append(check_any)
+
+    props = schema.get("properties")
+    required = list(schema.get("required") or [])
+    extra = schema.get("additionalProperties", True)
+    if isinstance(props, dict) or required or extra is not True:
+        props = props if isinstance(props, dict) else {}
+        fields = {k: _compile(s) for k, s in props.items()}
+        defaults = {k: s["default"] for k, s in props.items() if isinstance(s, dict) and "default" in s}
+        extra_check = _compile(extra) if isinstance(extra, dict) else None
+
+        def check_object(v, path, errors):
+            if not isinstance(v, dict):
+                return v
+            out = dict(v)
+            for k, d in defaults.items():  # antes de `required`: un campo con default nunca falta
+                out.setdefault(k, d)
+            for k in required:
+                if k not in out:
+                    errors.append({"path": f"{path}.{k}", "message": "campo requerido"})
+            for k, val in v.items():
+                sub = fields.get(k)
+                if sub is not None:
+                    out[k] = sub(val, f"{path}.{k}", errors)
+                elif extra is False:
+                    errors.append({"path": f"{path}.{k}", "message": "campo no permitido"})
+                elif extra_check is not None:
+                    out[k] = extra_check(val, f"{path}.{k}", errors)
+            return out
+        checks.append(check_object)
+
+    if isinstance(schema.get("items"), dict):
+        item = _compile(schema["items"])
+
+        def check_items(v, path, errors):
+            if not isinstance(v, list):
+                return v
+            return [item(x, f"{path}[{i}]", errors) for i, x in enumerate(v)]
+        checks.append(check_items)
+
+    if not checks:
+        return lambda v, path, errors: v
+    if len(checks) == 1:
+        return checks[0]
+
+    def run(v, path, errors):
+        for c in checks:
+            v = c(v, path, errors)
+        return v
+    return run
+
+
+def compile_validator(tool: str, schema: Optional[Dict[str, Any]]) -> Validator:
+    """
+    Validador precompilado para los `parameters` de una tool: devuelve los argumentos
+    con los defaults aplicados o lanza ArgumentError con todos los problemas juntos.
+    """
+    check = _compile(schema or {})
+
+    def validate(args: Dict[str, Any]) -> Dict[str, Any]:
+        errors: List[Dict[str, str]] = []
+        out = check(args, "$", errors)
+        if errors:
+            raise ArgumentError(tool, errors)
+        return out
+    return validate
+
+
+def schemas_by_name(openai_tools: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """{nombre seguro -> parameters} a partir de OPENAI_TOOLS."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for t in openai_tools:
+        fn = t.get("function", {}) if isinstance(t, dict) else {}
+        if fn.get("name"):
+            out[fn["name"]] = fn.get("parameters") or {}
+    return out
@@ -1,94 +1,188 @@
 # src/host_cli.py
 from __future__ import annotations
 
-import json, uuid, typer
-from typing import Any, Dict, List, Set
+import concurrent.futures, os, statistics, threading, time, typer
+from typing import Any, Callable, Dict, List, Optional, Set
 
-from .core.config import APP_TITLE, APP_VERSION, DEFAULT_SERVERS
-from .core.openai_client import build_openai_client, OPENAI_TOOLS, handle_tool_call
+from .core.config import APP_TITLE, APP_VERSION, DEFAULT_SERVERS, settings
+from .core.agent import Agent
+from .core.openai_client import build_openai_client, build_registry, build_summarizer, OPENAI_TOOLS
+from .core.registry import ToolRegistry
+from .core.resultcache import ResultCache
+from .core.shaping import ResultShaper
+from .core.toolselect import ToolSelector
+from .core.validate import schemas_by_name
 from .core.router import handle_colon_commands
 from .core.ui import (
     banner, print_help, print_servers_table, prompt_user,
     print_error, print_note, chat_user, chat_assistant,
-    start_thinking, stop_thinking
+    start_thinking, stop_thinking, update_thinking, stream_assistant, end_stream
 )
-from .mcp.client import MCPClient
+from .mcp.client import config_server_names
+from .mcp.catalog import ToolCatalog
+from .mcp.supervisor import connect_servers
 from .utils.memory import Memory
 from .utils.logger import JSONLLogger
-from .utils.jsonfmt import table_from_result
+from .utils.jsonfmt import encode_result, pick_format
+from .utils import codec
 
 # Inyección dinámica de tools remotas
 from .services.sitelens import import_remote_tools as import_sitelens_tools
 from .services.anime_helper import import_remote_tools as import_anime_tools
 from .services.remotemcp import import_remote_tools as import_remote_mcp_tools
+from .services.generic import import_remote_tools as import_generic_tools
 
 app = typer.Typer(help="Host CLI con UI mejorada (Rich) + tool-calling hacia MCP")
 
 RAW_MODE = {"enabled": False}  # :raw alterna salida cruda del último tool
 
 
-@app.callback(invoke_without_command=True)
-def chat(server: str = typer.Option("SQLScout", help="Server MCP por defecto para atajos")):
-    client, model = build_openai_client()
-    memory = Memory()
-    logger = JSONLLogger()
-
-    # Conectar a servidores MCP declarados
-    clients: Dict[str, MCPClient] = {}
-    ok, fail = [], []
-    for name in DEFAULT_SERVERS:
-        try:
-            clients[name] = MCPClient(server_name=name)
-            ok.append(name)
-        except Exception as e:
-            fail.append(f"{name} → {e}")
+# Servidores con importador propio (esquemas/descripciones curados)
+IMPORTERS = {
+    "SiteLens": import_sitelens_tools,
+    "anime-helper": import_anime_tools,
+    "RemoteMCP": import_remote_mcp_tools,     # RemoteMCP (remoto por HTTP/WSS)
+}
+BUILTIN_SERVERS = {"SQLScout", "FS", "Git"}   # wrappers fijos en openai_client
 
-    banner(APP_TITLE, APP_VERSION, model, logger.path)
-    print_help()
-    print_servers_table(clients, ok, fail)
+# Mensaje de sistema (recordatorio de cuándo usar cada server)
+SYSTEM_PROMPT = (
+    "Eres un asistente con acceso a FS, Git, SQL (SQLScout), SiteLens (auditoría HTML estático), "
+    "AnimeHelper (AniList/Jikan) y RemoteMCP (Cloudflare Workers). "
+    "Usa SIEMPRE herramientas cuando el usuario pida acciones o datos externos.\n"
+    "- FS: fs_create_dir, fs_write_text, fs_move, fs_list, fs_read_text, fs_trash_delete.\n"
+    "- Git: git_init_here, git_add_files, git_commit_msg, git_status_here, git_log_here.\n"
+    "- SQL: sql_load, sql_explain, sql_diagnose, sql_optimize, sql_apply, sql_optimize_apply.\n"
+    "- SiteLens: usa sitelens__aa_sitemap, sitelens__aa_scan_accessibility, sitelens__aa_link_check, "
+    "sitelens__aa_asset_budget, sitelens__aa_report.\n"
+    "- AnimeHelper: usa anime__ask para preguntas NL (\"¿en qué capítulo va One Piece?\", \"películas de esta temporada\"), "
+    "anime__search_media, anime__media_details, anime__trending, anime__season_top, anime__airing_status, anime__resolve_title.\n"
+    "- RemoteMCP: usa remote__remote_ping (ping), remote__remote_time (hora ISO), remote__remote_echo (eco de texto).\n"
+    "- Resultados largos llegan recortados con un handle: pide más con tool_result_page solo si hace falta.\n"
+    "Formatea los resultados en tablas claras cuando sea tabulable."
+)
 
-    # Importar tools remotas a OPENAI_TOOLS
 
-    # SiteLens
-    sitelens_names: Set[str] = set()
-    sitelens_map: Dict[str, str] = {}
+def _server_names(config_path: str = "mcp_config.json") -> List[str]:
+    """DEFAULT_SERVERS + cualquier otro servidor habilitado en mcp_config.json."""
     try:
-        sitelens_names, sitelens_map = import_sitelens_tools(clients, OPENAI_TOOLS)
+        extra = [n for n in config_server_names(config_path) if n not in DEFAULT_SERVERS]
     except Exception:
-        sitelens_names, sitelens_map = set(), {}
+        extra = []
+    return DEFAULT_SERVERS + extra
 
-    # AnimeHelper
-    anime_names: Set[str] = set()
-    anime_map: Dict[str, str] = {}
-    try:
-        anime_names, anime_map = import_anime_tools(clients, OPENAI_TOOLS)
-    except Exception:
-        anime_names, anime_map = set(), {}
 
-    # RemoteMCP (remoto por HTTP/WSS)
-    remote_names: Set[str] = set()
-    remote_map: Dict[str, str] = {}
+def _readonly_hints(client: Any, mapping: Dict[str, str]) -> Set[str]:
+    """Nombres seguros cuyas tools el server marca `annotations.readOnlyHint` (tools/list cacheado)."""
     try:
-        remote_names, remote_map = import_remote_mcp_tools(clients, OPENAI_TOOLS)
+        tools = (client.list_tools().get("result") or {}).get("tools") or []
     except Exception:
-        remote_names, remote_map = set(), {}
-
-    # Mensaje de sistema (recordatorio de cuándo usar cada server)
-    system_prompt = (
-        "Eres un asistente con acceso a FS, Git, SQL (SQLScout), SiteLens (auditoría HTML estático), "
-        "AnimeHelper (AniList/Jikan) y RemoteMCP (Cloudflare Workers). "
-        "Usa SIEMPRE herramientas cuando el usuario pida acciones o datos externos.\n"
-        "- FS: fs_create_dir, fs_write_text, fs_move, fs_list, fs_read_text, fs_trash_delete.\n"
-        "- Git: git_init_here, git_add_files, git_commit_msg, git_status_here, git_log_here.\n"
-        "- SQL: sql_load, sql_explain, sql_diagnose, sql_optimize, sql_apply, sql_optimize_apply.\n"
-        "- SiteLens: usa sitelens__aa_sitemap, sitelens__aa_scan_accessibility, sitelens__aa_link_check, "
-        "sitelens__aa_asset_budget, sitelens__aa_report.\n"
-        "- AnimeHelper: usa anime__ask para preguntas NL (\"¿en qué capítulo va One Piece?\", \"películas de esta temporada\"), "
-        "anime__search_media, anime__media_details, anime__trending, anime__season_top, anime__airing_status, anime__resolve_title.\n"
-        "- RemoteMCP: usa remote__remote_ping (ping), remote__remote_time (hora ISO), remote__remote_echo (eco de texto).\n"
-        "Formatea los resultados en tablas claras cuando sea tabulable."
+        return set()
+    ro = {t.get("name") for t in tools if isinstance(t, dict) and (t.get("annotations") or {}).get("readOnlyHint")}
+    return {safe for safe, remote in mapping.items() if remote in ro}
+
+
+def _cache_ttls(client: Any, mapping: Dict[str, str]) -> Dict[str, float]:
+    """TTLs del bloque opcional `"cache": {"ttl": N, "tools": {remote: N}}` del server en mcp_config.json."""
+    conf = (getattr(client, "config", None) or {}).get("cache") or {}
+    default = float(conf.get("ttl", 0))
+    per_tool = conf.get("tools") or {}
+    return {safe: float(per_tool.get(remote, default)) for safe, remote in mapping.items()}
+
+
+def _import_dynamic_tools(registry: ToolRegistry) -> None:
+    """Importa a OPENAI_TOOLS las tools remotas de cada servidor y las registra en `registry`."""
+    for server in list(registry.clients):
+        if server in BUILTIN_SERVERS:
+            continue
+        importer = IMPORTERS.get(server)
+        try:
+            if importer:
+                _, mapping = importer(registry.clients, OPENAI_TOOLS)
+            else:
+                _, mapping = import_generic_tools(server, registry.clients, OPENAI_TOOLS)
+        except Exception:
+            continue
+        client = registry.clients[server]
+        registry.register_remote(
+            server, mapping, schemas_by_name(OPENAI_TOOLS), _readonly_hints(client, mapping),
+            ttls=_cache_ttls(client, mapping),
+        )
+
+
+def _result_formatter(formats: Dict[str, str]) -> Callable[[Dict[str, Any], str], str]:
+    """Contenido del mensaje `tool`: JSON crudo con :raw; si no, en el formato de la tool (HOST_RESULT_FORMAT)."""
+    def fmt(resp: Dict[str, Any], tool: str = "") -> str:
+        if RAW_MODE["enabled"]:
+            return codec.dumps_str(resp, indent=True)
+        return encode_result(resp.get("result", resp), pick_format(formats, tool))
+    return fmt
+
+
+def _show_progress(params: Dict[str, Any]) -> None:
+    """Callback de `notifications/progress`: refleja el avance de la tool en el spinner."""
+    done, total = params.get("progress"), params.get("total")
+    step = f"{done}/{total}" if total else f"{done}"
+    update_thinking(f"Ejecutando tool… {step} {params.get('message') or ''}".rstrip())
+
+
+def _build_tools(clients: Dict[str, Any], lazy: bool = False) -> ToolRegistry:
+    """Registro de tools (FS/Git/SQL fijas) + tools remotas importadas a OPENAI_TOOLS."""
+    cfg = settings()
+    cache = ResultCache(cfg.cache_max_bytes) if cfg.cache_max_bytes > 0 else None
+    registry = build_registry(clients, cache)
+    if lazy:
+        # En segundo plano: el prompt aparece sin esperar a SiteLens / anime-helper / RemoteMCP
+        threading.Thread(target=_import_dynamic_tools, args=(registry,), daemon=True).start()
+    else:
+        _import_dynamic_tools(registry)
+    return registry
+
+
+@app.callback(invoke_without_command=True)
+def chat(
+    ctx: typer.Context,
+    server: str = typer.Option("SQLScout", help="Server MCP por defecto para atajos"),
+    lazy: bool = typer.Option(False, help="Conectar cada servidor MCP recién en su primera llamada"),
+    connect_timeout: float = typer.Option(20.0, help="Timeout (s) del handshake de cada servidor"),
+    stream: bool = typer.Option(True, help="Mostrar la respuesta mientras se genera (stream=True)"),
+):
+    if ctx.invoked_subcommand is not None:
+        return  # p. ej. `batch`: sin chat interactivo
+    client, model = build_openai_client()
+    memory = Memory(settings().memory_tokens, build_summarizer(client, model))
+    logger = JSONLLogger()
+
+    # Conectar a servidores MCP declarados (handshakes en paralelo, o diferidos con --lazy)
+    cfg = settings()
+    catalog = ToolCatalog(cfg.tool_cache_path)
+    clients, ok, fail = connect_servers(
+        _server_names(), timeout=connect_timeout, lazy=lazy, catalog=catalog, broker=cfg.mcp_broker,
+    )
+    for c in clients.values():
+        c.on_progress = _show_progress
+
+    banner(APP_TITLE, APP_VERSION, model, logger.path)
+    print_help()
+    print_servers_table(clients, ok, fail)
+
+    registry = _build_tools(clients, lazy)
+    selector = ToolSelector(OPENAI_TOOLS, registry, top_k=cfg.tool_top_k)
+    agent = Agent(
+        client, model, registry, selector,
+        max_steps=cfg.agent_max_steps,
+        token_budget=cfg.agent_token_budget,
+        stream=stream,
+        on_delta=stream_assistant,
+        speculate=cfg.speculative_tools,
+        format_result=_result_formatter(cfg.result_formats),
+        shaper=ResultShaper(cfg.tool_result_tokens, formats=cfg.result_formats),
+        on_status=update_thinking,
+        on_note=print_note,
+        log=logger.log,
     )
-    memory.add("system", system_prompt)
+
+    memory.add("system", SYSTEM_PROMPT)
 
     print_note("Escribe tu mensaje o un comando (:help).")
 
@@ -108,6 +202,7 @@ def chat(server: str = typer.Option("SQLScout", help="Server MCP por defecto par
             default_server=server,
             openai_tools=OPENAI_TOOLS,
             raw_state=RAW_MODE,
+            registry=registry,
         )
         if handled:
             logger.log({"event": "colon_cmd", "cmd": user})
@@ -120,94 +215,44 @@ def chat(server: str = typer.Option("SQLScout", help="Server MCP por defecto par
         # Mostrar tu mensaje como "burbuja"
         chat_user(user)
 
-        # === Chat + Tool Calling ===
+        # === Chat + Tool Calling (bucle multi-paso) ===
         messages: List[Dict[str, Any]] = memory.dump() + [{"role": "user", "content": user}]
 
         start_thinking("Pensando…")
         try:
-            reply = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                tools=OPENAI_TOOLS,
-                tool_choice="auto",
-                temperature=0.3,
-                max_tokens=700
-            )
+            result = agent.run(messages, user)
+        except KeyboardInterrupt:
+            end_stream()
+            print_note("Solicitud cancelada.")
+            continue
         except Exception as e:
-            stop_thinking()
+            end_stream()
             print_error(f"Error code: {getattr(e, 'status_code', 'unknown')} - {getattr(e, 'message', str(e))}")
             continue
+        finally:
+            stop_thinking()
+        if agent.last_raw is not None:
+            last_tool_raw = agent.last_raw
 
-        msg = reply.choices[0].message
-        tool_calls = getattr(msg, "tool_calls", None)
-
-        if tool_calls:
-            tool_results_msgs = []
-            for tc in tool_calls:
-                t_name = tc.function.name
-                try:
-                    args = json.loads(tc.function.arguments or "{}")
-                except Exception:
-                    args = {}
-
-                try:
-                    mcp_resp = handle_tool_call(
-                        t_name, args, clients,
-                        remote_sitelens_names=sitelens_names,
-                        remote_sitelens_map=sitelens_map,
-                        remote_anime_names=anime_names,
-                        remote_anime_map=anime_map,
-                        remote_remote_names=remote_names,
-                        remote_remote_map=remote_map,
-                    )
-                    raw_payload = json.dumps(mcp_resp, ensure_ascii=False, indent=2)
-                    last_tool_raw = raw_payload
-
-                    content = raw_payload if RAW_MODE["enabled"] else table_from_result(
-                        mcp_resp.get("result", mcp_resp)
-                    )
-                    tool_results_msgs.append({
-                        "role": "tool",
-                        "tool_call_id": getattr(tc, "id", str(uuid.uuid4())),
-                        "content": content
-                    })
-                except Exception as e:
-                    tool_results_msgs.append({
-                        "role": "tool",
-                        "tool_call_id": getattr(tc, "id", str(uuid.uuid4())),
-                        "content": f"ERROR ejecutando {t_name}: {e}"
-                    })
-
-            # Segunda pasada con resultados de tools
-            try:
-                follow = client.chat.completions.create(
-                    model=model,
-                    messages=messages + [
-                        {"role": "assistant", "content": msg.content or "", "tool_calls": [tc.__dict__ for tc in tool_calls]}
-                    ] + tool_results_msgs,
-                    temperature=0.2,
-                    max_tokens=800
-                )
-                final_text = follow.choices[0].message.content or ""
-            finally:
-                stop_thinking()
-
-            chat_assistant(final_text)
-            memory.add("user", user)
-            memory.add("assistant", final_text)
+        if not end_stream(result.text):  # sin streaming: burbuja de una vez
+            chat_assistant(result.text)
+        memory.add("user", user)
+        memory.add("assistant", result.text)
+        if result.used_tools:
+            if result.stop != "answer":
+                print_note(f"Se cortó por {'presupuesto de tokens' if result.stop == 'budget' else 'límite de pasos'}.")
             logger.log({
                 "event": "chat+tools",
                 "user": user,
-                "assistant": final_text,
-                "raw": bool(RAW_MODE["enabled"])
+                "assistant": result.text,
+                "raw": bool(RAW_MODE["enabled"]),
+                "steps": len(result.steps),
+                "stop": result.stop,
+                "tokens": result.tokens,
+                "memory_tokens": memory.tokens,
             })
         else:
-            stop_thinking()
-            text = msg.content or ""
-            chat_assistant(text)
-            memory.add("user", user)
-            memory.add("assistant", text)
-            logger.log({"event": "chat", "user": user, "assistant": text})
+            logger.log({"event": "chat", "user": user, "assistant": result.text})
 
     for c in clients.values():
         try:
@@ -218,5 +263,202 @@ def chat(server: str = typer.Option("SQLScout", help="Server MCP por defecto par
     print_note("Chat finalizado.")
 
 
+# ---- modo batch (sin UI interactiva) ----
+def _read_prompts(path: str) -> List[Dict[str, Any]]:
+    """
+    JSONL de entrada: una línea por prompt, `{"id": ..., "prompt": "..."}` (también acepta
+    "user", como en chat_log.jsonl) o un string JSON suelto. Sin "id" se usa el número de línea.
+    Una línea inválida no corta el batch: queda como item con "error" (sin "prompt").
+    """
+    out: List[Dict[str, Any]] = []
+    with open(path, "rb") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = codec.loads(line)
+            except ValueError as e:
+                out.append({"id": n, "error": f"línea {n}: JSON inválido ({e})"})
+                continue
+            if isinstance(item, str):
+                item = {"prompt": item}
+            text = item.get("prompt") or item.get("user") if isinstance(item, dict) else None
+            if not isinstance(text, str) or not text.strip():
+                rid = item.get("id", n) if isinstance(item, dict) else n
+                out.append({"id": rid, "error": f"línea {n}: falta \"prompt\""})
+                continue
+            out.append({"id": item.get("id", n), "prompt": text})
+    return out
+
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+@app.command()
+def batch(
+    input: str = typer.Option(..., "--input", "-i", help="JSONL con un prompt por línea"),
+    concurrency: int = typer.Option(8, "--concurrency", "-c", help="Prompts en paralelo"),
+    out: Optional[str] = typer.Option(None, "--out", "-o", help="JSONL de resultados (default: history/batch_<ts>.jsonl)"),
+    connect_timeout: float = typer.Option(20.0, help="Timeout (s) del handshake de cada servidor"),
+):
+    """
+    Corre cada prompt por el mismo bucle de tool-calling que el chat, cada uno con su
+    propia Memory y su ToolSelector, compartiendo los ServerPool MCP y la caché de tools.
+    Cada resultado (texto, tiempos, tokens) se escribe apenas termina; al final, resumen
+    de throughput y latencias. Ctrl-C corta lo pendiente y escribe el resumen igual.
+    """
+    items = _read_prompts(input)
+    prompts = [it for it in items if "error" not in it]
+    invalid = [it for it in items if "error" in it]
+    out = out or os.path.join("history", f"batch_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    client, model = build_openai_client()
+    logger = JSONLLogger()
+    cfg = settings()
+    catalog = ToolCatalog(cfg.tool_cache_path)
+    clients, ok, fail = connect_servers(_server_names(), timeout=connect_timeout, catalog=catalog, broker=cfg.mcp_broker)
+    for f in fail:
+        print_error(f"MCP {f}")
+    registry = _build_tools(clients)
+    print_note(f"{len(prompts)} prompts · concurrencia {concurrency} · servidores: {', '.join(ok) or '—'} · salida: {out}")
+    for it in invalid:
+        print_error(f"Entrada {it['error']}")
+
+    def _one(item: Dict[str, Any]) -> Dict[str, Any]:
+        memory = Memory()
+        memory.add("system", SYSTEM_PROMPT)
+        agent = Agent(
+            client, model, registry, ToolSelector(OPENAI_TOOLS, registry, top_k=cfg.tool_top_k),
+            max_steps=cfg.agent_max_steps,
+            token_budget=cfg.agent_token_budget,
+            format_result=_result_formatter(cfg.result_formats),
+            shaper=ResultShaper(cfg.tool_result_tokens, formats=cfg.result_formats),
+            log=lambda e: logger.log({**e, "batch_id": item["id"]}),
+        )
+        t0 = time.perf_counter()
+        rec: Dict[str, Any] = {"id": item["id"], "prompt": item["prompt"]}
+        try:
+            result = agent.run(memory.dump() + [{"role": "user", "content": item["prompt"]}], item["prompt"])
+        except Exception as e:
+            rec["error"] = f"{getattr(e, 'status_code', type(e).__name__)}: {getattr(e, 'message', str(e))}"
+        else:
+            rec.update({
+                "text": result.text,
+                "stop": result.stop,
+                "steps": len(result.steps),
+                "tools": [t for st in result.steps for t in st.tools],
+                "tokens": result.tokens,
+                "llm_ms": round(sum(st.llm_ms for st in result.steps), 1),
+                "tools_ms": round(sum(st.tools_ms for st in result.steps), 1),
+            })
+        rec["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return rec
+
+    lat: List[float] = []
+    tokens = 0
+    errors = len(invalid)
+    t0 = time.perf_counter()
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    futures = [pool.submit(_one, item) for item in prompts]
+    try:
+        with open(out, "wb") as f:
+            for it in invalid:  # líneas de entrada rotas: error por item, el resto sigue
+                f.write(codec.dumps_line(it))
+            pending = set(futures)
+            while pending:
+                done, pending = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    rec = fut.result()
+                    f.write(codec.dumps_line(rec))
+                    f.flush()
+                    lat.append(rec["ms"])
+                    tokens += rec.get("tokens", 0)
+                    errors += "error" in rec
+                    print_note(f"[{len(lat)}/{len(prompts)}] {rec['id']} · {rec['ms'] / 1000:.1f}s"
+                               + (f" · ERROR {rec['error']}" if "error" in rec else f" · {rec['stop']}"))
+    except KeyboardInterrupt:
+        print_note("Batch cancelado: se descartan los prompts pendientes.")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    wall = time.perf_counter() - t0
+
+    summary = {
+        "event": "batch",
+        "input": input,
+        "out": out,
+        "prompts": len(prompts),
+        "invalid": len(invalid),
+        "done": len(lat),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "throughput": round(len(lat) / wall, 3) if wall else 0.0,
+        "p50_ms": _pct(lat, .5) if lat else None,
+        "p95_ms": _pct(lat, .95) if lat else None,
+        "mean_ms": round(statistics.mean(lat), 1) if lat else None,
+        "tokens": tokens,
+    }
+    if registry.cache is not None:
+        summary["cache_hit_ratio"] = round(registry.cache.stats()["hit_ratio"], 3)
+    logger.log(summary)
+    print_note(
+        f"{len(lat)}/{len(prompts)} prompts ({errors} con error) en {wall:.1f}s · "
+        f"{summary['throughput']:.2f} prompts/s · latencia p50 {(summary['p50_ms'] or 0) / 1000:.1f}s "
+        f"p95 {(summary['p95_ms'] or 0) / 1000:.1f}s · {tokens} tokens"
+        + (f" · {len(invalid)} líneas inválidas" if invalid else "")
+    )
+
+    for c in clients.values():
+        try:
+            c.close()
+        except Exception:
+            pass
+
+
+# ---- modo servidor (multi-sesión, HTTP/WebSocket) ----
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Interfaz donde escuchar"),
+    port: int = typer.Option(8765, help="Puerto HTTP"),
+    concurrency: int = typer.Option(8, "--concurrency", "-c", help="Turnos ejecutándose a la vez (entre todas las sesiones)"),
+    idle_ttl: float = typer.Option(3600.0, help="Segundos sin actividad antes de descartar una sesión"),
+    lazy: bool = typer.Option(False, help="Conectar cada servidor MCP recién en su primera llamada"),
+    connect_timeout: float = typer.Option(20.0, help="Timeout (s) del handshake de cada servidor"),
+):
+    """Sirve el chat+tools por HTTP/WebSocket: una Memory por sesión, un solo pool MCP para todas."""
+    try:
+        from aiohttp import web
+        from .host_server import HostServer
+    except ImportError:
+        print_error("El modo servidor requiere aiohttp: pip install aiohttp")
+        raise typer.Exit(1)
+
+    client, model = build_openai_client()
+    cfg = settings()
+    catalog = ToolCatalog(cfg.tool_cache_path)
+    clients, ok, fail = connect_servers(
+        _server_names(), timeout=connect_timeout, lazy=lazy, catalog=catalog, broker=cfg.mcp_broker,
+    )
+    for f in fail:
+        print_error(f"MCP {f}")
+    registry = _build_tools(clients, lazy)
+    server = HostServer(
+        client, model, registry, cfg, SYSTEM_PROMPT, _result_formatter(cfg.result_formats),
+        concurrency=concurrency, idle_ttl=idle_ttl,
+    )
+    print_note(f"Escuchando en http://{host}:{port} · concurrencia {concurrency} · servidores: {', '.join(ok) or '—'}")
+    try:
+        web.run_app(server.app(), host=host, port=port, print=None)
+    finally:
+        for c in clients.values():
+            try:
+                c.close()
+            except Exception:
+                pass
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,218 @@
+# src/host_server.py
+"""
+Modo servidor del host (requiere aiohttp): expone el bucle chat+tools por HTTP y
+WebSocket a muchas sesiones a la vez, compartiendo un solo ServerPool por servidor MCP,
+un cliente OpenAI y la caché de tools.
+
+  POST   /sessions                 → {"session": id}
+  DELETE /sessions/{id}
+  POST   /sessions/{id}/chat       {"message": "..."} → NDJSON en streaming
+                                   (?stream=0: un solo JSON con el evento "done")
+  GET    /sessions/{id}/ws         WebSocket: cada mensaje {"message": "..."} (o texto plano)
+  GET    /ws                       igual, creando una sesión nueva (evento "session")
+  GET    /health                   sesiones, turnos en curso/encolados, servers, caché
+
+Eventos: {"type": "queued"|"status"|"delta"|"reset"|"done"|"error", ...}. "delta" trae
+el texto nuevo; "reset" reemplaza todo el texto (un paso nuevo del agente).
+"""
+from __future__ import annotations
+
+import asyncio, time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from aiohttp import WSMsgType, web
+
+from .core.agent import Agent
+from .core.config import AppSettings
+from .core.registry import ToolRegistry
+from .core.sessions import FairScheduler, Session, SessionStore
+from .core.shaping import ResultShaper
+from .core.toolselect import ToolSelector
+from .core.openai_client import OPENAI_TOOLS, build_summarizer
+from .utils.logger import JSONLLogger
+from .utils.memory import Memory
+from .utils import codec
+
+
+class HostServer:
+    def __init__(
+        self, client: Any, model: str, registry: ToolRegistry, cfg: AppSettings,
+        system_prompt: str, format_result, concurrency: int = 8, idle_ttl: float = 3600.0,
+        logger: Optional[JSONLLogger] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.registry = registry
+        self.cfg = cfg
+        self.format_result = format_result
+        self.logger = logger or JSONLLogger()
+        summarize = build_summarizer(client, model)
+        self.sessions = SessionStore(
+            lambda: ToolSelector(OPENAI_TOOLS, registry, top_k=cfg.tool_top_k), system_prompt, idle_ttl=idle_ttl,
+            make_memory=lambda: Memory(cfg.memory_tokens, summarize),
+            make_shaper=lambda: ResultShaper(cfg.tool_result_tokens, formats=cfg.result_formats),
+        )
+        self.scheduler = FairScheduler(concurrency)
+
+    # ---- un turno ----
+    async def turn(self, session: Session, message: str) -> AsyncIterator[Dict[str, Any]]:
+        """Encola el turno (round-robin entre sesiones) y va emitiendo sus eventos."""
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+        def emit(evt: Dict[str, Any]):
+            loop.call_soon_threadsafe(events.put_nowait, evt)
+
+        shown = {"text": ""}
+
+        def on_delta(text: str):
+            prev = shown["text"]
+            shown["text"] = text
+            if text.startswith(prev):
+                emit({"type": "delta", "text": text[len(prev):]})
+            else:
+                emit({"type": "reset", "text": text})
+
+        def job() -> Dict[str, Any]:
+            # Corre en un hilo; la Memory se lee recién ahora (turnos de la misma sesión en orden)
+            agent = Agent(
+                self.client, self.model, self.registry, session.selector,
+                max_steps=self.cfg.agent_max_steps,
+                token_budget=self.cfg.agent_token_budget,
+                stream=True,
+                on_delta=on_delta,
+                speculate=self.cfg.speculative_tools,
+                format_result=self.format_result,
+                shaper=session.shaper,
+                on_status=lambda t: emit({"type": "status", "text": t}),
+                log=lambda e: self.logger.log({**e, "session": session.id}),
+            )
+            t0 = time.perf_counter()
+            result = agent.run(session.memory.dump() + [{"role": "user", "content": message}], message)
+            session.memory.add("user", message)
+            session.memory.add("assistant", result.text)
+            session.turns += 1
+            return {
+                "type": "done",
+                "text": result.text,
+                "stop": result.stop,
+                "steps": len(result.steps),
+                "tools": [t for st in result.steps for t in st.tools],
+                "tokens": result.tokens,
+                "ms": round((time.perf_counter() - t0) * 1000, 1),
+            }
+
+        if self.scheduler.running >= self.scheduler.slots:
+            yield {"type": "queued", "ahead": self.scheduler.queued}
+        fut = asyncio.ensure_future(self.scheduler.run(session.id, job))
+        fut.add_done_callback(lambda _f: events.put_nowait({"type": "_end"}))
+        try:
+            while True:
+                evt = await events.get()
+                if evt["type"] == "_end":
+                    break
+                yield evt
+        finally:
+            if not fut.done():
+                fut.cancel()  # cliente desconectado: si no empezó, no se ejecuta
+        try:
+            done = fut.result()
+        except Exception as e:
+            yield {"type": "error", "message": f"{getattr(e, 'status_code', type(e).__name__)}: {getattr(e, 'message', str(e))}"}
+            return
+        self.logger.log({"event": "server_turn", "session": session.id, "user": message, "assistant": done["text"],
+                         "steps": done["steps"], "stop": done["stop"], "tokens": done["tokens"], "ms": done["ms"]})
+        yield done
+
+    # ---- HTTP ----
+    def _session(self, request: web.Request) -> Session:
+        s = self.sessions.get(request.match_info["sid"])
+        if s is None:
+            raise web.HTTPNotFound(text=codec.dumps_str({"error": "sesión inexistente"}), content_type="application/json")
+        return s
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        return web.json_response({"session": self.sessions.create().id}, status=201, dumps=codec.dumps_str)
+
+    async def delete_session(self, request: web.Request) -> web.Response:
+        if not self.sessions.drop(request.match_info["sid"]):
+            raise web.HTTPNotFound()
+        return web.Response(status=204)
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        session = self._session(request)
+        try:
+            body = codec.loads(await request.read())
+            message = str(body["message"]).strip()
+        except Exception:
+            raise web.HTTPBadRequest(text='Se esperaba {"message": "..."}')
+        if request.query.get("stream") in ("0", "false"):
+            last: Dict[str, Any] = {}
+            async for evt in self.turn(session, message):
+                last = evt
+            return web.json_response(last, status=200 if last.get("type") == "done" else 502, dumps=codec.dumps_str)
+
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        async for evt in self.turn(session, message):
+            await resp.write(codec.dumps_line(evt))
+        await resp.write_eof()
+        return resp
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        if "sid" in request.match_info:
+            session = self._session(request)
+        else:
+            session = self.sessions.create()
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        await ws.send_str(codec.dumps_str({"type": "session", "session": session.id}))
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            try:
+                data = codec.loads(msg.data)
+                message = str(data["message"] if isinstance(data, dict) else data).strip()
+            except Exception:
+                message = msg.data.strip()
+            if not message:
+                continue
+            async for evt in self.turn(session, message):
+                await ws.send_str(codec.dumps_str(evt))
+        return ws
+
+    async def health(self, request: web.Request) -> web.Response:
+        self.sessions.expire()
+        out: Dict[str, Any] = {
+            "sessions": len(self.sessions),
+            "running": self.scheduler.running,
+            "queued": self.scheduler.queued,
+            "slots": self.scheduler.slots,
+            "servers": {name: getattr(c, "status", lambda: "?")() for name, c in self.registry.clients.items()},
+        }
+        if self.registry.cache is not None:
+            out["cache"] = self.registry.cache.stats()
+        return web.json_response(out, dumps=codec.dumps_str)
+
+    async def _janitor(self, app: web.Application):
+        async def loop():
+            while True:
+                await asyncio.sleep(60)
+                self.sessions.expire()
+        task = asyncio.ensure_future(loop())
+        yield
+        task.cancel()
+        self.scheduler.shutdown()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/sessions", self.create_session),
+            web.delete("/sessions/{sid}", self.delete_session),
+            web.post("/sessions/{sid}/chat", self.chat),
+            web.get("/sessions/{sid}/ws", self.websocket),
+            web.get("/ws", self.websocket),
+            web.get("/health", self.health),
+        ])
+        app.cleanup_ctx.append(self._janitor)
+        return app
@@ -0,0 +1,369 @@
+# src/mcp/broker.py
+"""
+Broker MCP local: un daemon que es dueño de los procesos de los servers stdio (FS, Git,
+SiteLens, SQLScout, anime-helper…) y los comparte entre todas las instancias del host.
+Cada host se conecta por un socket Unix (TCP local en Windows) en milisegundos en vez de
+lanzar npx/python y esperar los handshakes; los procesos quedan calientes entre sesiones.
+
+    python -m src.mcp.broker [--config mcp_config.json] [--status | --stop]
+
+Config (nivel superior de mcp_config.json, todo opcional):
+  "broker": {"address": ".cache/mcp-broker.sock" | "tcp://127.0.0.1:8766",
+             "autostart": true, "idle_exit": 1800, "start_timeout": 15,
+             "catalog": ".cache/broker_catalog.json", "log": "history/stderr/broker.log"}
+Las rutas relativas son relativas a la carpeta de mcp_config.json (la raíz del proyecto),
+no al directorio desde donde se lance el broker o el host.
+`autostart`: el primer host que no lo encuentra lo lanza en segundo plano.
+`idle_exit`: segundos sin hosts conectados antes de apagarse (0 = nunca).
+
+Protocolo: JSON-RPC por líneas, igual que stdio. Cada conexión elige su server con
+`broker/attach {"server": nombre}` y luego usa initialize / tools/list / tools/call / ping
+como con el server real (progreso y `notifications/cancelled` incluidos). Por dentro cada
+server es un ServerPool (pool, health-check, reinicios, coalescing) iniciado a demanda.
+"""
+from __future__ import annotations
+
+import argparse, asyncio, json, os, signal, subprocess, sys, time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .catalog import ToolCatalog
+from .client import MCPConfigError, load_server_config
+from .supervisor import ServerPool
+from ..utils import codec
+
+_LIMIT = 64 * 1024 * 1024  # línea JSON máxima (fs_write_text con archivos grandes)
+_SPAWNED_AT = 0.0
+
+
+def _default_address() -> str:
+    return "tcp://127.0.0.1:8766" if os.name == "nt" else ".cache/mcp-broker.sock"
+
+
+def _resolve(config_path: str, path: str) -> str:
+    """Ruta relativa → relativa a la carpeta de mcp_config.json."""
+    if path.startswith("tcp://") or os.path.isabs(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), path)
+
+
+def broker_options(config_path: str) -> Dict[str, Any]:
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            opts = json.load(f).get("broker") or {}
+    except (OSError, ValueError):
+        opts = {}
+    return {
+        "address": _resolve(config_path, opts.get("address") or _default_address()),
+        "catalog": _resolve(config_path, opts.get("catalog") or ".cache/broker_catalog.json"),
+        "log": _resolve(config_path, opts.get("log") or "history/stderr/broker.log"),
+        "autostart": bool(opts.get("autostart", True)),
+        "idle_exit": float(opts.get("idle_exit", 1800)),
+        "start_timeout": float(opts.get("start_timeout", 15)),
+    }
+
+
+def _hostport(address: str) -> Tuple[str, int]:
+    host, _, port = address[len("tcp://"):].rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+async def _connect(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if address.startswith("tcp://"):
+        return await asyncio.open_connection(*_hostport(address), limit=_LIMIT)
+    return await asyncio.open_unix_connection(address, limit=_LIMIT)
+
+
+def _spawn(config_path: str, log_path: str):
+    """Lanza el broker desacoplado del host (sobrevive a la terminal que lo inició)."""
+    global _SPAWNED_AT
+    if time.monotonic() - _SPAWNED_AT < 30:
+        return  # otro miembro de este host ya lo lanzó
+    _SPAWNED_AT = time.monotonic()
+    config_path = os.path.abspath(config_path)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    if os.name == "nt":
+        detach: Dict[str, Any] = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    with open(log_path, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", __name__, "--config", config_path],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, cwd=os.getcwd(), **detach,
+        )
+
+
+async def open_broker(config_path: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Conexión al broker; si no corre y `autostart`, lo lanza y reintenta hasta `start_timeout`."""
+    opts = broker_options(config_path)
+    address = opts["address"]
+    try:
+        return await _connect(address)
+    except OSError:
+        if not opts["autostart"]:
+            raise ConnectionError(f"broker MCP no disponible en {address}")
+    _spawn(config_path, opts["log"])
+    deadline = time.monotonic() + opts["start_timeout"]
+    while True:
+        await asyncio.sleep(0.1)
+        try:
+            return await _connect(address)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise ConnectionError(f"el broker MCP no arrancó en {opts['start_timeout']:g}s (ver {opts['log']})")
+
+
+class _RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class _Conn:
+    """Un host conectado (atado a un solo server tras broker/attach)."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.server: Optional[str] = None
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._lock = asyncio.Lock()
+
+    async def send(self, obj: Dict[str, Any]):
+        async with self._lock:
+            self.writer.write(codec.dumps_line(obj))
+            await self.writer.drain()
+
+
+class Broker:
+    def __init__(self, config_path: str = "mcp_config.json", idle_exit: float = 0.0):
+        self.config_path = config_path
+        self.catalog = ToolCatalog(broker_options(config_path)["catalog"])
+        self.idle_exit = idle_exit
+        self.pools: Dict[str, ServerPool] = {}
+        self._starting: Dict[str, asyncio.Future] = {}
+        self.conns: Set[_Conn] = set()
+        self.requests = 0
+        self.started = time.time()
+        self._last_seen = time.monotonic()
+        self._stop: Optional[asyncio.Event] = None
+
+    # ---- servers ----
+    async def pool(self, name: str) -> ServerPool:
+        """ServerPool de `name`, lanzado en la primera conexión que lo pide (uno solo a la vez)."""
+        p = self.pools.get(name)
+        if p is not None:
+            return p
+        fut = self._starting.get(name)
+        if fut is None:
+            fut = asyncio.ensure_future(self._start(name))
+            self._starting[name] = fut
+            fut.add_done_callback(lambda _f: self._starting.pop(name, None))
+        return await asyncio.shield(fut)
+
+    async def _start(self, name: str) -> ServerPool:
+        p = ServerPool(self.config_path, name, lazy=True, catalog=self.catalog)
+        limit = float(p.config.get("connect_timeout", 20))
+        try:
+            await asyncio.wait_for(p.aconnect(), limit)
+        except BaseException:
+            await p.aclose()
+            raise
+        p.add_notification_handler(
+            "notifications/tools/list_changed",
+            lambda params, n=name: self._fanout(n, "notifications/tools/list_changed", params),
+        )
+        self.pools[name] = p
+        return p
+
+    def _fanout(self, server: str, method: str, params: Dict[str, Any]):
+        for conn in list(self.conns):
+            if conn.server == server:
+                asyncio.ensure_future(conn.send({"jsonrpc": "2.0", "method": method, "params": params}))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "connections": len(self.conns),
+            "requests": self.requests,
+            "servers": {name: p.status() for name, p in self.pools.items()},
+        }
+
+    # ---- conexiones ----
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = _Conn(writer)
+        self.conns.add(conn)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    msg = codec.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(msg, dict):
+                    continue
+                if msg.get("id") is None:
+                    self._notification(conn, msg.get("method"), msg.get("params") or {})
+                    continue
+                rid = str(msg["id"])
+                task = asyncio.ensure_future(self._answer(conn, msg))
+                conn.tasks[rid] = task
+                task.add_done_callback(lambda _t, rid=rid: conn.tasks.pop(rid, None))
+        finally:
+            self.conns.discard(conn)
+            for task in list(conn.tasks.values()):
+                task.cancel()  # host caído: sus llamadas en vuelo se cancelan en el server
+            writer.close()
+            self._last_seen = time.monotonic()
+
+    def _notification(self, conn: _Conn, method: Optional[str], params: Dict[str, Any]):
+        if method == "notifications/cancelled":
+            task = conn.tasks.get(str(params.get("requestId")))
+            if task is not None:
+                task.cancel()
+        # notifications/initialized y demás: el broker ya hizo el handshake con el server
+
+    async def _answer(self, conn: _Conn, msg: Dict[str, Any]):
+        try:
+            body = await self._handle(conn, msg["method"], msg.get("params") or {})
+        except asyncio.CancelledError:
+            return  # el host la abandonó: no espera respuesta
+        except _RPCError as e:
+            body = {"error": {"code": e.code, "message": str(e)}}
+        except Exception as e:
+            body = {"error": {"code": -32603, "message": str(e)}}
+        self.requests += 1
+        try:
+            await conn.send({"jsonrpc": "2.0", "id": msg["id"], **body})
+        except Exception:
+            pass
+
+    async def _handle(self, conn: _Conn, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if method == "broker/attach":
+            try:
+                load_server_config(self.config_path, params.get("server", ""))
+            except (MCPConfigError, OSError) as e:
+                raise _RPCError(-32602, str(e))
+            conn.server = params["server"]
+            return {"result": {"server": conn.server}}
+        if method == "broker/status":
+            return {"result": self.status()}
+        if method == "broker/stop":
+            assert self._stop is not None
+            self._stop.set()
+            return {"result": {}}
+        if method == "ping":
+            return {"result": {}}
+        if conn.server is None:
+            raise _RPCError(-32600, "falta broker/attach")
+
+        pool = await self.pool(conn.server)
+        if method == "initialize":
+            return {"result": pool.members[0].init_result}
+        if method == "tools/list":
+            resp = await pool.alist_tools()
+        elif method == "tools/call":
+            token = (params.get("_meta") or {}).get("progressToken")
+
+            def relay(p: Dict[str, Any]):
+                asyncio.ensure_future(conn.send({
+                    "jsonrpc": "2.0", "method": "notifications/progress", "params": {**p, "progressToken": token},
+                }))
+            resp = await pool.acall(
+                params.get("name", ""), params.get("arguments") or {}, on_progress=relay if token is not None else None,
+            )
+        else:
+            raise _RPCError(-32601, f"método no soportado por el broker: {method}")
+        return {k: resp[k] for k in ("result", "error") if k in resp}
+
+    # ---- ciclo de vida ----
+    async def run(self):
+        """Espera a broker/stop, SIGTERM o `idle_exit` s sin hosts; luego cierra los servers."""
+        self._stop = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._stop.set)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            pass  # Windows
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), 5)
+            except asyncio.TimeoutError:
+                idle = time.monotonic() - self._last_seen
+                if self.idle_exit > 0 and not self.conns and idle > self.idle_exit:
+                    break
+        await asyncio.gather(*(p.aclose() for p in self.pools.values()), return_exceptions=True)
+
+
+async def serve(config_path: str, address: str, idle_exit: float = 0.0) -> bool:
+    """Levanta el broker en `address`; False si ya hay otro escuchando ahí."""
+    broker = Broker(config_path, idle_exit=idle_exit)
+    if address.startswith("tcp://"):
+        try:
+            server = await asyncio.start_server(broker.handle, *_hostport(address), limit=_LIMIT)
+        except OSError:
+            return False
+    else:
+        if os.path.exists(address):
+            try:
+                _, w = await _connect(address)
+                w.close()
+                return False
+            except OSError:
+                os.unlink(address)  # socket huérfano de un broker anterior
+        os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+        server = await asyncio.start_unix_server(broker.handle, address, limit=_LIMIT)
+        os.chmod(address, 0o600)
+    try:
+        async with server:
+            await broker.run()
+    finally:
+        if not address.startswith("tcp://") and os.path.exists(address):
+            os.unlink(address)
+    return True
+
+
+async def _command(address: str, method: str) -> Dict[str, Any]:
+    reader, writer = await _connect(address)
+    writer.write(codec.dumps_line({"jsonrpc": "2.0", "id": 1, "method": method, "params": {}}))
+    await writer.drain()
+    resp = codec.loads(await reader.readline())
+    writer.close()
+    return resp
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Broker MCP local compartido entre hosts")
+    ap.add_argument("--config", default="mcp_config.json")
+    ap.add_argument("--address", help="socket Unix o tcp://host:puerto (default: config o .cache/mcp-broker.sock)")
+    ap.add_argument("--idle-exit", type=float, help="segundos sin hosts antes de apagarse (0 = nunca)")
+    ap.add_argument("--status", action="store_true", help="estado del broker en marcha")
+    ap.add_argument("--stop", action="store_true", help="apagar el broker en marcha")
+    a = ap.parse_args()
+
+    opts = broker_options(a.config)
+    address = a.address or opts["address"]
+    if a.status or a.stop:
+        try:
+            resp = asyncio.run(_command(address, "broker/stop" if a.stop else "broker/status"))
+        except OSError:
+            print(f"No hay broker en {address}")
+            sys.exit(1)
+        print(codec.dumps_str(resp.get("result", resp), indent=True))
+        return
+    idle_exit = opts["idle_exit"] if a.idle_exit is None else a.idle_exit
+    try:
+        started = asyncio.run(serve(a.config, address, idle_exit))
+    except KeyboardInterrupt:
+        return
+    if not started:
+        print(f"Ya hay un broker escuchando en {address}")
+
+
+if __name__ == "__main__":
+    main()
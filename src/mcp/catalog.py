@@ -0,0 +1,74 @@
+# src/mcp/catalog.py
+from __future__ import annotations
+
+import os, threading, time
+from typing import Any, Dict, List, Optional
+
+from ..utils import codec
+
+
+class ToolCatalog:
+    """
+    Cache de `tools/list` por servidor, con la versión que el server reporta en
+    `initialize` (serverInfo.version) y snapshot en disco. Así `:servers` no cuesta
+    viajes y el siguiente arranque arma OPENAI_TOOLS antes de terminar los handshakes.
+    Se invalida con `notifications/tools/list_changed` o si cambia la versión del server.
+    """
+
+    def __init__(self, path: Optional[str] = ".cache/tool_catalog.json"):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = codec.loads(f.read())
+        except (OSError, ValueError):
+            return  # snapshot corrupto: se reconstruye solo
+        if isinstance(data, dict):
+            with self._lock:
+                self._entries = {k: v for k, v in data.items() if isinstance(v, dict) and isinstance(v.get("tools"), list)}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            blob = codec.dumps(self._entries)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def get(self, server: str, version: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Tools cacheadas; si se pasa `version`, sólo si coincide con la del snapshot."""
+        with self._lock:
+            entry = self._entries.get(server)
+        if entry is None or (version is not None and entry.get("version") != version):
+            return None
+        return entry["tools"]
+
+    def put(self, server: str, version: Optional[str], tools: List[Dict[str, Any]]):
+        with self._lock:
+            self._entries[server] = {"version": version, "tools": tools, "ts": time.time()}
+        self.save()
+
+    def check_version(self, server: str, version: Optional[str]):
+        """Descarta el snapshot si el server conectado reporta otra versión."""
+        with self._lock:
+            entry = self._entries.get(server)
+        if entry is not None and entry.get("version") != version:
+            self.invalidate(server)
+
+    def invalidate(self, server: str):
+        with self._lock:
+            dropped = self._entries.pop(server, None)
+        if dropped is not None:
+            self.save()
@@ -1,115 +1,734 @@
-import json, subprocess, uuid, os, requests
-from typing import Any, Dict
+import asyncio, collections, concurrent.futures, contextlib, json, uuid, os, threading, time, requests
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from ..utils import codec
+
+if TYPE_CHECKING:
+    from .catalog import ToolCatalog
+
+T = TypeVar("T")
 
 class MCPConfigError(Exception): ...
+class MCPTimeoutError(TimeoutError): ...
+
+PROTOCOL_VERSION = "2024-11-05"
+CLIENT_INFO = {"name": "host-cli", "version": "1.0"}
+
+# Tamaño de cada lectura de stdout (configurable con "read_buffer"); el framing por
+# líneas es propio, así que un mensaje puede medir varios MB sin tocar límites de StreamReader
+_READ_BUFFER = 64 * 1024
+
+# Líneas de stderr que se conservan en memoria por servidor (configurable con "stderr_buffer")
+_STDERR_LINES = 500
+
+# Timeout por defecto de tools/call (s); se ajusta con "call_timeout" y "tool_timeouts"
+_CALL_TIMEOUT = 120.0
+
+
+# ---- loop asyncio compartido ----
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Loop asyncio en un hilo daemon, compartido por todos los MCPClient."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="mcp-loop", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+_SCOPE = threading.local()
+
+
+@contextlib.contextmanager
+def cancel_scope(event: Optional[threading.Event]):
+    """
+    Liga `event` al hilo actual: mientras dure, run_sync en este hilo cancela su
+    corrutina (con notifications/cancelled) apenas el evento se activa. Es el Ctrl-C
+    de los hilos de trabajo, que no reciben KeyboardInterrupt.
+    """
+    prev = getattr(_SCOPE, "event", None)
+    _SCOPE.event = event
+    try:
+        yield
+    finally:
+        _SCOPE.event = prev
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Ejecuta una corrutina en el loop compartido y espera su resultado (fachada síncrona).
+    La espera es por intervalos cortos para que Ctrl-C llegue; en ese caso se cancela
+    la corrutina (que avisa al server con notifications/cancelled) y se relanza. Dentro
+    de un cancel_scope activado se cancela igual y se lanza CancelledError.
+    """
+    scope: Optional[threading.Event] = getattr(_SCOPE, "event", None)
+    if scope is not None and scope.is_set():
+        coro.close()
+        raise concurrent.futures.CancelledError()
+    fut = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        while not fut.done():
+            concurrent.futures.wait([fut], timeout=0.2)
+            if scope is not None and scope.is_set() and not fut.done():
+                fut.cancel()
+                raise concurrent.futures.CancelledError()
+    except KeyboardInterrupt:
+        fut.cancel()
+        raise
+    return fut.result()
+
+
+def _error_response(rid: Any, message: str, code: int = -32603) -> Dict[str, Any]:
+    """Respuesta JSON-RPC de error armada del lado cliente (timeouts, fallos de transporte)."""
+    return {"jsonrpc": "2.0", "id": rid, "error": {"code": code, "message": message}}
+
+
+def load_server_config(config_path: str, server_name: str) -> Dict[str, Any]:
+    """Entrada de `server_name` en mcp_config.json (MCPConfigError si no existe)."""
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    servers = cfg.get("servers", [])
+    match = next((s for s in servers if s.get("name") == server_name), None)
+    if not match:
+        raise MCPConfigError(f"Server '{server_name}' no encontrado en {config_path}")
+    return match
+
+
+def config_server_names(config_path: str) -> List[str]:
+    """Nombres de los servidores de mcp_config.json, salvo los marcados `"enabled": false`."""
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    return [s["name"] for s in cfg.get("servers", []) if s.get("name") and s.get("enabled", True)]
+
 
 class MCPClient:
-    def __init__(self, config_path: str = "mcp_config.json", server_name: str = "SQLScout"):
-        with open(config_path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
+    """
+    Cliente MCP asíncrono con fachada síncrona.
+    - stdio: un solo pipe por servidor; una tarea lectora en segundo plano enruta
+      cada respuesta a su future pendiente según el `id` JSON-RPC, así que varias
+      llamadas pueden estar en vuelo a la vez.
+    - http: cada POST corre en el executor del loop sobre una requests.Session con pool
+      de conexiones keep-alive (no bloquea otras llamadas).
+    - streamable-http: igual que http, pero acepta respuestas `text/event-stream`; las
+      notificaciones (p. ej. `notifications/progress`) se despachan apenas llega cada evento.
+    - broker (via_broker=True en un server stdio): mismo framing por líneas que stdio, pero
+      sobre el socket del broker local (src/mcp/broker.py), que es dueño del proceso.
+    `call`/`list_tools` siguen siendo síncronos; `acall`/`alist_tools` son la API async.
+    Con lazy=True el constructor no lanza nada: el handshake ocurre en la primera llamada.
+    """
 
-        servers = cfg.get("servers", [])
-        match = next((s for s in servers if s.get("name") == server_name), None)
-        if not match:
-            raise MCPConfigError(f"Server '{server_name}' no encontrado en {config_path}")
+    def __init__(
+        self, config_path: str = "mcp_config.json", server_name: str = "SQLScout",
+        lazy: bool = False, via_broker: bool = False,
+    ):
+        match = load_server_config(config_path, server_name)
 
         self.server_name = server_name
+        self.config_path = config_path
+        self.config = match
         self.transport = match.get("transport", "stdio")
-        self.proc = None
-        if self.transport == "stdio":
-            self._init_stdio(match)
-        elif self.transport == "http":
-            self._init_http(match)
-        else:
+        if via_broker and self.transport == "stdio":
+            self.transport = "broker"
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        # Streams del framing por líneas: pipes del proceso (stdio) o socket (broker)
+        self._rx: Optional[asyncio.StreamReader] = None
+        self._tx: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._dead: Optional[BaseException] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._stderr_log = None
+        self.stderr_tail: Deque[str] = collections.deque(maxlen=int(match.get("stderr_buffer", _STDERR_LINES)))
+        self.on_progress: Optional[Callable[[Dict[str, Any]], None]] = None  # callback por defecto
+        self._progress: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self.catalog: Optional["ToolCatalog"] = None  # cache de tools/list (lo asigna ServerPool)
+        self.server_version: Optional[str] = None
+        self.add_notification_handler("notifications/tools/list_changed", self._on_list_changed)
+        self.read_buffer = max(4096, int(match.get("read_buffer", _READ_BUFFER)))
+        self.call_timeout = float(match.get("call_timeout", _CALL_TIMEOUT))
+        self.tool_timeouts: Dict[str, float] = {k: float(v) for k, v in match.get("tool_timeouts", {}).items()}
+        self.init_result: Dict[str, Any] = {}  # `result` de initialize (serverInfo, capabilities)
+        if self.transport not in ("stdio", "broker", "http", "streamable-http"):
             raise MCPConfigError(f"Transporte '{self.transport}' no soportado")
 
+        self.connected = False
+        self.connect_time: Optional[float] = None  # segundos que tomó el handshake
+        self._connect_lock: Optional[asyncio.Lock] = None
+        if not lazy:
+            run_sync(self.aconnect())
+
     def _id(self) -> str:
         return str(uuid.uuid4())
 
+    @property
+    def _framed(self) -> bool:
+        """JSON-RPC por líneas sobre un stream (stdio o broker), no HTTP."""
+        return self.transport in ("stdio", "broker")
+
+    async def aconnect(self):
+        """Lanza el servidor y hace el handshake `initialize` una sola vez (idempotente)."""
+        if self.connected:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.connected:
+                return
+            t0 = time.perf_counter()
+            self._dead = None
+            try:
+                if self.transport == "stdio":
+                    await self._init_stdio(self.config)
+                elif self.transport == "broker":
+                    await self._init_broker()
+                else:
+                    await self._init_http(self.config)
+            except BaseException:
+                await self.aclose()  # no dejar procesos a medio iniciar
+                raise
+            self.connect_time = time.perf_counter() - t0
+            self.connected = True
+
     # ---- stdio ----
-    def _init_stdio(self, config: Dict[str, Any]):
+    async def _init_stdio(self, config: Dict[str, Any]):
         cmd = [config["command"]] + config.get("args", [])
         cwd = config.get("cwd", ".")
         env = os.environ.copy()
         env.update(config.get("env", {}))
         env["PYTHONIOENCODING"] = "utf-8"; env["PYTHONUTF8"] = "1"
 
-        self.proc = subprocess.Popen(
-            cmd, cwd=cwd, env=env,
-            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            text=True, encoding="utf-8", bufsize=1
+        self.proc = await asyncio.create_subprocess_exec(
+            *cmd, cwd=cwd, env=env,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            limit=self.read_buffer,
         )
+        self._rx, self._tx = self.proc.stdout, self.proc.stdin
+        self._dead = None
+        log_path = config.get("stderr_log")
+        if log_path and self._stderr_log is None:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            self._stderr_log = open(log_path, "ab")
+        self._stderr_task = asyncio.ensure_future(self._drain_stderr())
+        self._reader = asyncio.ensure_future(self._read_stdio())
 
-        self._send_stdio({
-            "jsonrpc": "2.0", "id": self._id(),
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "clientInfo": {"name": "host-cli", "version": "1.0"},
-                "capabilities": {}
-            }
+        self._on_initialized(await self._request(self._initialize_request()))
+        await self._send_stdio({"jsonrpc": "2.0", "method": "notifications/initialized", "params": {}})
+
+    async def _send_stdio(self, obj: Dict[str, Any]):
+        assert self._tx is not None
+        if self._dead is not None:
+            raise self._dead
+        self._tx.write(codec.dumps_line(obj))
+        await self._tx.drain()
+
+    async def _read_stdio(self):
+        """Tarea lectora: despacha cada línea de stdout (o del socket) a la petición que la espera."""
+        assert self._rx is not None
+        buf = bytearray()
+        try:
+            while True:
+                chunk = await self._rx.read(self.read_buffer)
+                if not chunk:
+                    break
+                scan = len(buf)  # sólo se busca '\n' en lo recién llegado
+                buf += chunk
+                start = 0
+                while True:
+                    nl = buf.find(b"\n", scan)
+                    if nl < 0:
+                        break
+                    line = bytes(buf[start:nl])
+                    start = scan = nl + 1
+                    if not line.strip():
+                        continue
+                    try:
+                        msg = codec.loads(line)
+                    except ValueError:
+                        continue  # ruido no-JSON en stdout
+                    self._dispatch(msg)
+                if start:
+                    del buf[:start]
+        except Exception as e:
+            self._fail_pending(RuntimeError(f"Error leyendo del servidor: {e}"))
+            return
+
+        if self._stderr_task:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._stderr_task), 1.0)
+            except Exception:
+                pass
+        self._fail_pending(RuntimeError(f"Sin respuesta del servidor.\nSTDERR:\n{self.stderr_text(last=50)}"))
+
+    async def _drain_stderr(self):
+        """Vacía stderr continuamente para que el pipe nunca se llene y bloquee al hijo."""
+        assert self.proc and self.proc.stderr
+        rest = b""
+        while True:
+            chunk = await self.proc.stderr.read(65536)
+            if not chunk:
+                break
+            if self._stderr_log:
+                try:
+                    self._stderr_log.write(chunk); self._stderr_log.flush()
+                except OSError:
+                    pass
+            *lines, rest = (rest + chunk).split(b"\n")
+            for line in lines:
+                self.stderr_tail.append(line.decode("utf-8", "replace").rstrip("\r"))
+            if len(rest) > 65536:  # línea sin salto demasiado larga: se corta
+                self.stderr_tail.append(rest.decode("utf-8", "replace"))
+                rest = b""
+        if rest:
+            self.stderr_tail.append(rest.decode("utf-8", "replace").rstrip("\r"))
+
+    def stderr_text(self, last: Optional[int] = None) -> str:
+        """Últimas líneas de stderr del servidor (todo el buffer si last=None)."""
+        lines = list(self.stderr_tail)
+        if last is not None:
+            lines = lines[-last:]
+        return "\n".join(lines)
+
+    def _dispatch(self, msg: Any):
+        if not isinstance(msg, dict):
+            return
+        if "id" in msg and ("result" in msg or "error" in msg):
+            fut = self._pending.pop(str(msg["id"]), None)
+            if fut and not fut.done():
+                fut.set_result(msg)
+            return
+        method = msg.get("method")
+        if not method or "id" in msg:
+            return  # requests server->cliente: no soportados
+        params = msg.get("params") or {}
+        if method == "notifications/progress":
+            cb = self._progress.get(str(params.get("progressToken")))
+            if cb:
+                try: cb(params)
+                except Exception: pass
+        for cb in self._handlers.get(method, []):
+            try: cb(params)
+            except Exception: pass
+
+    def add_notification_handler(self, method: str, cb: Callable[[Dict[str, Any]], None]):
+        """Registra un callback para notificaciones del servidor (corre en el hilo del loop)."""
+        self._handlers.setdefault(method, []).append(cb)
+
+    def _fail_pending(self, exc: BaseException):
+        self._dead = exc
+        pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    # ---- broker ----
+    async def _init_broker(self):
+        """Conecta al broker (lo lanza si no corre y `autostart`), elige el server y hace initialize."""
+        from .broker import open_broker
+
+        self._rx, self._tx = await open_broker(self.config_path)
+        self._dead = None
+        self._reader = asyncio.ensure_future(self._read_stdio())
+        attached = await self._request({
+            "jsonrpc": "2.0", "id": self._id(), "method": "broker/attach", "params": {"server": self.server_name},
         })
-        self._read_stdio()
-        self._send_stdio({"jsonrpc": "2.0", "method": "notifications/initialized", "params": {}})
-
-    def _send_stdio(self, obj: Dict[str, Any]):
-        assert self.proc and self.proc.stdin
-        self.proc.stdin.write(json.dumps(obj, ensure_ascii=False) + "\n")
-        self.proc.stdin.flush()
-
-    def _read_stdio(self) -> Dict[str, Any]:
-        assert self.proc and self.proc.stdout
-        line = self.proc.stdout.readline()
-        if not line:
-            err = self.proc.stderr.read() if self.proc.stderr else ""
-            raise RuntimeError(f"Sin respuesta del servidor.\nSTDERR:\n{err}")
-        return json.loads(line)
+        if "error" in attached:
+            raise MCPConfigError(f"broker: {attached['error'].get('message')}")
+        self._on_initialized(await self._request(self._initialize_request()))
+        await self._send_stdio({"jsonrpc": "2.0", "method": "notifications/initialized", "params": {}})
 
     # ---- http ----
-    def _init_http(self, config: Dict[str, Any]):
+    async def _init_http(self, config: Dict[str, Any]):
         self.base_url = config.get("url", "").rstrip("/")
         self.endpoint = config.get("endpoint", "/mcp")
         self.timeout = config.get("timeout", 30)
-        self.headers = {"Content-Type": "application/json"}
         if not self.base_url:
             raise MCPConfigError("URL es requerida para transporte HTTP")
 
-        self._send_http({
+        # Sesión persistente: pool de conexiones keep-alive (evita TCP+TLS por llamada)
+        opts = config.get("http", {})
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=int(opts.get("pool_connections", 4)),
+            pool_maxsize=int(opts.get("pool_maxsize", 8)),
+            max_retries=int(opts.get("retries", 0)),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if self.transport == "streamable-http":
+            self.headers["Accept"] = "application/json, text/event-stream"
+        if opts.get("gzip", True):
+            self.headers["Accept-Encoding"] = "gzip, deflate"  # requests descomprime solo
+        if not opts.get("keep_alive", True):
+            self.headers["Connection"] = "close"
+        self.session.headers.update(self.headers)
+        self.session_id: Optional[str] = None  # header Mcp-Session-Id asignado por el server
+
+        await asyncio.get_running_loop().run_in_executor(None, self._handshake_http)
+
+    def _handshake_http(self):
+        """`initialize` + `notifications/initialized` (al conectar y al re-crear una sesión expirada)."""
+        self._on_initialized(self._send_http(self._initialize_request(), retry=False))
+        try:
+            self._send_http({"jsonrpc": "2.0", "method": "notifications/initialized", "params": {}}, retry=False)
+        except Exception:
+            pass
+
+    def _on_initialized(self, resp: Dict[str, Any]):
+        """Guarda serverInfo.version y descarta el catálogo cacheado si cambió."""
+        self.init_result = resp.get("result") or {}
+        info = self.init_result.get("serverInfo") or {}
+        self.server_version = info.get("version")
+        if self.catalog is not None:
+            self.catalog.check_version(self.server_name, self.server_version)
+
+    def _initialize_request(self) -> Dict[str, Any]:
+        return {
             "jsonrpc": "2.0", "id": self._id(),
             "method": "initialize",
             "params": {
-                "protocolVersion": "2024-11-05",
-                "clientInfo": {"name": "host-cli", "version": "1.0"},
+                "protocolVersion": PROTOCOL_VERSION,
+                "clientInfo": CLIENT_INFO,
                 "capabilities": {}
             }
-        })
-        try:
-            self._send_http({"jsonrpc": "2.0","method":"notifications/initialized","params":{}})
-        except: pass
+        }
 
-    def _send_http(self, obj: Dict[str, Any]) -> Dict[str, Any]:
-        import requests
+    def _send_http(self, obj: Any, retry: bool = True) -> Any:
+        """POST de un mensaje (dict) o de un batch JSON-RPC (list); devuelve lo mismo que se envió."""
         url = f"{self.base_url}{self.endpoint}"
-        r = requests.post(url, json=obj, headers=self.headers, timeout=self.timeout)
-        if r.status_code == 204:
-            return {"result": "notification sent"}
-        r.raise_for_status()
-        return r.json()
+        headers = {"Mcp-Session-Id": self.session_id} if self.session_id else None
+        stream = self.transport == "streamable-http"
+        batch = isinstance(obj, list)
+        method = None if batch else obj.get("method")
+        with self.session.post(url, data=codec.dumps(obj), headers=headers, timeout=self.timeout, stream=stream) as r:
+            if r.status_code == 404 and self.session_id and retry and method != "initialize":
+                # La sesión expiró en el server: se re-inicializa y se reintenta una vez
+                self.session_id = None
+                self._handshake_http()
+                return self._send_http(obj, retry=False)
+            sid = r.headers.get("Mcp-Session-Id")
+            if sid:
+                self.session_id = sid
+            if r.status_code in (202, 204):
+                return {"result": "notification sent"}
+            r.raise_for_status()
+            if r.headers.get("Content-Type", "").startswith("text/event-stream"):
+                ids = [m.get("id") for m in obj if "id" in m] if batch else [obj.get("id")]
+                found = self._read_sse(r, ids)
+                return found if batch else found[0]
+            return codec.loads(r.content)
 
-    # ---- API ----
-    def list_tools(self) -> Dict[str, Any]:
-        req = {"jsonrpc": "2.0","id": self._id(),"method":"tools/list","params":{}}
-        if self.transport == "stdio":
-            self._send_stdio(req); return self._read_stdio()
-        return self._send_http(req)
+    def _read_sse(self, r: requests.Response, ids: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Consume un stream SSE a medida que llegan los chunks hasta tener la respuesta
+        de cada id en `ids`. Los demás mensajes (progreso, logs, resultados parciales)
+        se despachan al loop en el acto, sin esperar a que termine el cuerpo.
+        """
+        loop = get_loop()
+        waiting = {str(i) for i in ids}
+        found: List[Dict[str, Any]] = []
+        rest = b""
+        data: List[str] = []
+
+        def _event():
+            if not data:
+                return
+            try:
+                msg = codec.loads("\n".join(data))
+            except ValueError:
+                return
+            finally:
+                data.clear()
+            for m in (msg if isinstance(msg, list) else [msg]):
+                if isinstance(m, dict) and str(m.get("id")) in waiting and ("result" in m or "error" in m):
+                    waiting.discard(str(m.get("id")))
+                    found.append(m)
+                else:
+                    loop.call_soon_threadsafe(self._dispatch, m)
+
+        for chunk in r.iter_content(chunk_size=None):
+            *lines, rest = (rest + chunk).split(b"\n")
+            for raw in lines:
+                line = raw.decode("utf-8", "replace").rstrip("\r")
+                if not line:
+                    _event()
+                    if not waiting:
+                        return found
+                    continue
+                if line.startswith(":"):
+                    continue  # comentario / keep-alive
+                field, _, value = line.partition(":")
+                if field == "data":
+                    data.append(value[1:] if value.startswith(" ") else value)
+        if rest.strip().startswith(b"data:"):
+            value = rest.decode("utf-8", "replace").strip()[5:]
+            data.append(value[1:] if value.startswith(" ") else value)
+        _event()
+        if found:
+            return found
+        raise RuntimeError("El stream SSE terminó sin respuesta a la petición.")
+
+    def _close_http(self):
+        session = getattr(self, "session", None)
+        if session is None:
+            return
+        if self.session_id:
+            # Cierre explícito de la sesión MCP (best effort)
+            try:
+                session.delete(f"{self.base_url}{self.endpoint}", headers={"Mcp-Session-Id": self.session_id}, timeout=2)
+            except Exception:
+                pass
+            self.session_id = None
+        session.close()
 
-    def call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    # ---- multiplexado ----
+    async def _request(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if not self._framed:
+            return await loop.run_in_executor(None, self._send_http, req)
+
+        rid = str(req["id"])
+        fut = loop.create_future()
+        self._pending[rid] = fut
+        try:
+            await self._send_stdio(req)
+            return await fut
+        finally:
+            self._pending.pop(rid, None)
+
+    # ---- API async ----
+    async def alist_tools(self) -> Dict[str, Any]:
+        """
+        tools/list pasando por el catálogo: si hay snapshot (de la misma versión del
+        server, o cualquiera si aún no se conectó) no hay viaje al server.
+        """
+        cached = self.cached_tools()
+        if cached is not None:
+            return cached
+        await self.aconnect()
+        resp = await self._request({"jsonrpc": "2.0","id": self._id(),"method":"tools/list","params":{}})
+        tools = (resp.get("result") or {}).get("tools")
+        if self.catalog is not None and isinstance(tools, list):
+            self.catalog.put(self.server_name, self.server_version, tools)
+        return resp
+
+    def cached_tools(self) -> Optional[Dict[str, Any]]:
+        """Respuesta de tools/list armada desde el catálogo, o None si no hay snapshot válido."""
+        if self.catalog is None:
+            return None
+        tools = self.catalog.get(self.server_name, self.server_version if self.connected else None)
+        if tools is None:
+            return None
+        return {"jsonrpc": "2.0", "id": None, "result": {"tools": tools}}
+
+    def _on_list_changed(self, _params: Dict[str, Any]):
+        if self.catalog is not None:
+            self.catalog.invalidate(self.server_name)
+
+    def _tool_request(self, name: str, arguments: Dict[str, Any], on_progress) -> Dict[str, Any]:
+        """Arma un tools/call; si hay callback de progreso, pide un progressToken."""
         req = {"jsonrpc":"2.0","id": self._id(),"method":"tools/call","params":{"name":name,"arguments":arguments}}
-        if self.transport == "stdio":
-            self._send_stdio(req); return self._read_stdio()
-        return self._send_http(req)
+        cb = on_progress or self.on_progress
+        if cb is not None:
+            req["params"]["_meta"] = {"progressToken": req["id"]}
+            self._progress[req["id"]] = cb
+        return req
 
-    def close(self):
-        if self.transport == "stdio" and self.proc:
-            try: self.proc.terminate()
+    def _limit(self, name: str, timeout: Optional[float]) -> float:
+        return timeout if timeout is not None else self.tool_timeouts.get(name, self.call_timeout)
+
+    async def acall(
+        self, name: str, arguments: Dict[str, Any],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        tools/call. Si hay `on_progress` (o self.on_progress), se pide un progressToken
+        y cada `notifications/progress` del server llega al callback mientras corre la tool.
+        Timeout: `timeout` > "tool_timeouts"[name] > "call_timeout" (0 = sin límite). Si vence
+        o la llamada se cancela, se envía `notifications/cancelled` al server.
+        """
+        await self.aconnect()
+        req = self._tool_request(name, arguments, on_progress)
+        limit = self._limit(name, timeout)
+        try:
+            if limit and limit > 0:
+                return await asyncio.wait_for(self._request(req), limit)
+            return await self._request(req)
+        except asyncio.TimeoutError:
+            self._cancel_soon(req["id"], f"timeout ({limit:g}s)")
+            raise MCPTimeoutError(f"{self.server_name}.{name} no respondió en {limit:g}s")
+        except asyncio.CancelledError:
+            self._cancel_soon(req["id"], "cancelado por el usuario")
+            raise
+        finally:
+            self._progress.pop(req["id"], None)
+
+    async def acall_many(
+        self, calls: List[Tuple[str, Dict[str, Any]]],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Varias tools/call en un solo viaje: batch JSON-RPC (array) por HTTP y escrituras
+        encadenadas (pipelining) por stdio. Devuelve las respuestas en el orden de `calls`;
+        un fallo individual vuelve como respuesta JSON-RPC con "error" sin afectar al resto.
+        """
+        if not calls:
+            return []
+        await self.aconnect()
+        reqs = [self._tool_request(name, args, on_progress) for name, args in calls]
+        limits = [self._limit(name, timeout) for name, _ in calls]
+        try:
+            if self._framed:
+                return await self._pipeline(reqs, limits)
+            return await self._batch_http(reqs, limits)
+        finally:
+            for req in reqs:
+                self._progress.pop(req["id"], None)
+
+    async def _pipeline(self, reqs: List[Dict[str, Any]], limits: List[float]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        futs = []
+        for req in reqs:
+            fut = loop.create_future()
+            self._pending[req["id"]] = fut
+            futs.append(fut)
+        try:
+            try:
+                if self._dead is not None:
+                    raise self._dead
+                assert self._tx is not None
+                self._tx.write(b"".join(codec.dumps_line(req) for req in reqs))
+                await self._tx.drain()
+            except Exception as e:
+                return [_error_response(req["id"], str(e)) for req in reqs]
+            return list(await asyncio.gather(*(self._await_item(r, f, l) for r, f, l in zip(reqs, futs, limits))))
+        finally:
+            for req in reqs:
+                self._pending.pop(req["id"], None)
+
+    async def _await_item(self, req: Dict[str, Any], fut: asyncio.Future, limit: float) -> Dict[str, Any]:
+        try:
+            if limit and limit > 0:
+                return await asyncio.wait_for(fut, limit)
+            return await fut
+        except asyncio.TimeoutError:
+            self._cancel_soon(req["id"], f"timeout ({limit:g}s)")
+            return _error_response(req["id"], f"{req['params']['name']} no respondió en {limit:g}s")
+        except asyncio.CancelledError:
+            self._cancel_soon(req["id"], "cancelado por el usuario")
+            raise
+        except Exception as e:
+            return _error_response(req["id"], str(e))
+
+    async def _batch_http(self, reqs: List[Dict[str, Any]], limits: List[float]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        limit = max(limits) if all(l and l > 0 for l in limits) else None
+        try:
+            pending = loop.run_in_executor(None, self._send_http, reqs)
+            resp = await asyncio.wait_for(pending, limit) if limit else await pending
+        except asyncio.TimeoutError:
+            for req in reqs:
+                self._cancel_soon(req["id"], f"timeout ({limit:g}s)")
+            return [_error_response(req["id"], f"el batch no respondió en {limit:g}s") for req in reqs]
+        except asyncio.CancelledError:
+            for req in reqs:
+                self._cancel_soon(req["id"], "cancelado por el usuario")
+            raise
+        except Exception as e:
+            return [_error_response(req["id"], str(e)) for req in reqs]
+        by_id = {str(m.get("id")): m for m in (resp if isinstance(resp, list) else [resp]) if isinstance(m, dict)}
+        return [by_id.get(str(req["id"])) or _error_response(req["id"], "sin respuesta en el batch") for req in reqs]
+
+    def _cancel_soon(self, rid: str, reason: str):
+        """Avisa al server que abandonamos `rid` sin demorar a quien cancela."""
+        note = {"jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": rid, "reason": reason}}
+
+        async def _send():
+            try:
+                if self._framed:
+                    await self._send_stdio(note)
+                else:
+                    await asyncio.get_running_loop().run_in_executor(None, self._send_http, note)
+            except Exception:
+                pass
+        asyncio.ensure_future(_send())
+
+    async def aping(self, timeout: float = 5.0) -> Dict[str, Any]:
+        """`ping` MCP; lanza si el servidor no contesta dentro de `timeout`."""
+        await self.aconnect()
+        return await asyncio.wait_for(
+            self._request({"jsonrpc": "2.0", "id": self._id(), "method": "ping", "params": {}}), timeout
+        )
+
+    @property
+    def alive(self) -> bool:
+        """True si está conectado y (en stdio) el proceso sigue vivo con su pipe abierto."""
+        if not self.connected or self._dead is not None:
+            return False
+        if self.transport == "broker":
+            return self._tx is not None and not self._tx.is_closing()
+        return self.transport != "stdio" or (self.proc is not None and self.proc.returncode is None)
+
+    async def arestart(self):
+        """Cierra (si hace falta) y vuelve a lanzar el servidor con un handshake nuevo."""
+        await self.aclose()
+        await self.aconnect()
+
+    async def aclose(self, grace: float = 3.0):
+        """Cierra el transporte; en stdio hace terminate(), espera `grace` s y luego kill()."""
+        self.connected = False
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
+        self._fail_pending(RuntimeError(f"Cliente '{self.server_name}' cerrado"))
+        if self.transport == "stdio" and self.proc and self.proc.returncode is None:
+            try:
+                self.proc.terminate()
+                await asyncio.wait_for(self.proc.wait(), grace)
+            except asyncio.TimeoutError:
+                try:
+                    self.proc.kill()
+                    await self.proc.wait()
+                except ProcessLookupError:
+                    pass
+            except ProcessLookupError:
+                pass
+        if self.transport == "broker" and self._tx is not None:
+            self._tx.close()  # el proceso sigue vivo en el broker
+            self._tx = None
+        if not self._framed:
+            await asyncio.get_running_loop().run_in_executor(None, self._close_http)
+        if self._stderr_log:
+            try: self._stderr_log.close()
             except: pass
+            self._stderr_log = None
+
+    # ---- API síncrona (fachada) ----
+    def list_tools(self) -> Dict[str, Any]:
+        return run_sync(self.alist_tools())
+
+    def call(
+        self, name: str, arguments: Dict[str, Any],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        return run_sync(self.acall(name, arguments, on_progress=on_progress, timeout=timeout))
+
+    def call_many(
+        self, calls: List[Tuple[str, Dict[str, Any]]],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        return run_sync(self.acall_many(calls, on_progress=on_progress, timeout=timeout))
+
+    def close(self):
+        run_sync(self.aclose())
+
@@ -0,0 +1,402 @@
+# src/mcp/supervisor.py
+from __future__ import annotations
+
+import asyncio, json, time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .catalog import ToolCatalog
+from .client import MCPClient, load_server_config, run_sync
+
+
+class ServerPool:
+    """
+    Supervisor de un servidor MCP: mantiene `size` procesos (MCPClient) calientes,
+    los vigila con `ping` cada `health_interval` s y reinicia los caídos con backoff
+    exponencial. Expone la misma API que MCPClient, así que el host lo usa igual.
+
+    Config en mcp_config.json (todo opcional):
+      "pool": {"size": 2, "health_interval": 30, "ping_timeout": 5,
+               "backoff": 1, "max_backoff": 60, "broadcast": ["sql.load"]}
+    `broadcast`: tools que cambian el estado del proceso (p. ej. cargar un esquema);
+    se envían a todos los procesos y se re-aplican a los que se reinician. Un miembro
+    en el que falla una de ellas queda fuera del reparto y se reinicia (con replay).
+    "multiplex" (nivel servidor): si el host puede mandarle lecturas concurrentes;
+    por defecto sí en HTTP o con más de un proceso.
+    via_broker=True: los servers stdio (salvo `"broker": false`) se usan a través del
+    broker local, que mantiene los procesos (y su pool) entre sesiones del host.
+    "coalesce" (nivel servidor): true o lista de tools. Llamadas idénticas (misma tool
+    y mismos argumentos) que coinciden en vuelo comparten un solo tools/call upstream
+    y todas reciben su respuesta (single-flight). Sólo para tools sin efectos.
+    """
+
+    def __init__(
+        self, config_path: str = "mcp_config.json", server_name: str = "SQLScout",
+        lazy: bool = False, catalog: Optional[ToolCatalog] = None, via_broker: bool = False,
+    ):
+        config = load_server_config(config_path, server_name)
+        opts = config.get("pool", {})
+
+        self.server_name = server_name
+        self.config = config
+        self.transport = config.get("transport", "stdio")
+        # En HTTP la concurrencia ya la da el pool de conexiones: un solo miembro
+        self.size = max(1, int(opts.get("size", 1))) if self.transport == "stdio" else 1
+        self.health_interval = float(opts.get("health_interval", 30))
+        self.ping_timeout = float(opts.get("ping_timeout", 5))
+        self.backoff = float(opts.get("backoff", 1))
+        self.max_backoff = float(opts.get("max_backoff", 60))
+        self.broadcast = set(opts.get("broadcast", []))
+        self.multiplex = bool(config.get("multiplex", self.size > 1 or self.transport != "stdio"))
+        self.via_broker = bool(via_broker and self.transport == "stdio" and config.get("broker", True))
+        if self.via_broker:
+            self.size = 1  # el pool de procesos vive en el broker
+        coalesce = config.get("coalesce", False)
+        self.coalesce = coalesce if isinstance(coalesce, bool) else set(coalesce)
+        self.coalesced = 0  # llamadas que se ahorraron el viaje al server
+
+        self.members = [
+            MCPClient(config_path, server_name, lazy=True, via_broker=self.via_broker) for _ in range(self.size)
+        ]
+        for m in self.members:
+            m.catalog = catalog
+        self.restarts = [0] * self.size
+        self._failures = [0] * self.size
+        self._retry_at = [0.0] * self.size
+        self._inflight = [0] * self.size
+        self._replay: List[Tuple[str, Dict[str, Any]]] = []
+        self._stale: Set[int] = set()  # miembros desincronizados: sin tráfico hasta reiniciar
+        self._restarting: Dict[int, asyncio.Future] = {}
+        self._flights: Dict[Tuple[str, str], List[Any]] = {}  # clave -> [task, interesados]
+        self._health: Optional[asyncio.Task] = None
+        if not lazy:
+            run_sync(self.aconnect())
+
+    # ---- estado ----
+    @property
+    def connected(self) -> bool:
+        return any(m.connected for m in self.members)
+
+    @property
+    def connect_time(self) -> Optional[float]:
+        times = [m.connect_time for m in self.members if m.connect_time is not None]
+        return max(times) if times else None
+
+    @property
+    def on_progress(self) -> Optional[Callable[[Dict[str, Any]], None]]:
+        return self.members[0].on_progress
+
+    @on_progress.setter
+    def on_progress(self, cb: Optional[Callable[[Dict[str, Any]], None]]):
+        for m in self.members:
+            m.on_progress = cb
+
+    def add_notification_handler(self, method: str, cb: Callable[[Dict[str, Any]], None]):
+        for m in self.members:
+            m.add_notification_handler(method, cb)
+
+    def status(self) -> str:
+        """Resumen para :servers, p. ej. '2/2 vivos · 1 reinicio'."""
+        alive = sum(1 for m in self.members if m.alive)
+        total = sum(self.restarts)
+        out = f"{alive}/{self.size} vivos · {total} reinicio{'' if total == 1 else 's'}"
+        if self._stale:
+            out += f" · {len(self._stale)} desincronizado{'' if len(self._stale) == 1 else 's'}"
+        if self.via_broker:
+            out += " · broker"
+        return out + (f" · {self.coalesced} coalescidas" if self.coalesced else "")
+
+    def stderr_text(self, last: Optional[int] = None) -> str:
+        if self.via_broker:
+            return "(el proceso corre en el broker: ver su \"stderr_log\" o `python -m src.mcp.broker --status`)"
+        if self.size == 1:
+            return self.members[0].stderr_text(last=last)
+        return "\n".join(f"--- #{i} ---\n{m.stderr_text(last=last)}" for i, m in enumerate(self.members))
+
+    # ---- supervisión ----
+    async def aconnect(self):
+        await asyncio.gather(*(m.aconnect() for m in self.members))
+        if self._health is None and self.health_interval > 0:
+            self._health = asyncio.ensure_future(self._health_loop())
+
+    async def _restart(self, i: int):
+        """Reinicia el miembro i respetando su backoff y re-aplica las tools `broadcast`."""
+        wait = self._retry_at[i] - time.monotonic()
+        if wait > 0:
+            raise RuntimeError(f"{self.server_name}#{i} en backoff ({wait:.1f}s)")
+        m = self.members[i]
+        try:
+            await m.arestart()
+            for name, args in self._replay:
+                await m.acall(name, args)
+        except Exception:
+            self._failures[i] += 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (self._failures[i] - 1))
+            self._retry_at[i] = time.monotonic() + delay
+            raise
+        self.restarts[i] += 1
+        self._stale.discard(i)
+        self._failures[i] = 0
+        self._retry_at[i] = 0.0
+
+    async def _ensure(self, i: int):
+        """Un solo reinicio en curso por miembro; los demás interesados esperan el mismo."""
+        task = self._restarting.get(i)
+        if task is None:
+            task = asyncio.ensure_future(self._restart(i))
+            self._restarting[i] = task
+            task.add_done_callback(lambda _t, i=i: self._restarting.pop(i, None))
+        await asyncio.shield(task)
+
+    def _restart_soon(self, i: int):
+        async def _quiet():
+            try:
+                await self._ensure(i)
+            except Exception:
+                pass
+        asyncio.ensure_future(_quiet())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for i, m in enumerate(self.members):
+                if m.connect_time is None:
+                    continue  # nunca conectado (lazy): no se despierta
+                try:
+                    if not m.alive or i in self._stale:
+                        raise RuntimeError("proceso caído o desincronizado")
+                    if self._inflight[i] == 0:  # un server ocupado puede tardar en contestar el ping
+                        await m.aping(self.ping_timeout)
+                except Exception:
+                    try:
+                        await self._ensure(i)
+                    except Exception:
+                        pass
+
+    async def _pick(self) -> int:
+        """Miembro vivo con menos llamadas en vuelo; si no hay ninguno, reinicia uno ya."""
+        await self.aconnect()
+        live = [i for i in range(self.size) if self._usable(i)]
+        if live:
+            return min(live, key=lambda i: self._inflight[i])
+        last: Optional[Exception] = None
+        for i in range(self.size):
+            try:
+                await self._ensure(i)
+                return i
+            except Exception as e:
+                last = e
+        raise RuntimeError(f"Servidor '{self.server_name}' caído: {last}")
+
+    def _usable(self, i: int) -> bool:
+        return self.members[i].alive and i not in self._stale
+
+    async def _on(self, i: int, fn: Callable[[MCPClient], Any]) -> Dict[str, Any]:
+        self._inflight[i] += 1
+        try:
+            return await fn(self.members[i])
+        except Exception:
+            if not self.members[i].alive:
+                self._restart_soon(i)
+            raise
+        finally:
+            self._inflight[i] -= 1
+
+    # ---- API async ----
+    async def alist_tools(self) -> Dict[str, Any]:
+        cached = self.members[0].cached_tools()  # sin despertar miembros lazy
+        if cached is not None:
+            return cached
+        return await self._on(await self._pick(), lambda m: m.alist_tools())
+
+    async def acall(
+        self, name: str, arguments: Dict[str, Any],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        if name in self.broadcast and self.size > 1:
+            return await self._broadcast(name, arguments, on_progress, timeout)
+
+        async def _call() -> Dict[str, Any]:
+            return await self._on(
+                await self._pick(), lambda m: m.acall(name, arguments, on_progress=on_progress, timeout=timeout)
+            )
+        if self._coalesces(name):
+            return await self._single_flight((name, _args_key(arguments)), _call)
+        return await _call()
+
+    def _coalesces(self, name: str) -> bool:
+        if name in self.broadcast:
+            return False
+        return self.coalesce if isinstance(self.coalesce, bool) else name in self.coalesce
+
+    async def _single_flight(self, key: Tuple[str, str], make: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        Comparte la llamada en vuelo con la misma clave. El progreso y el timeout son los
+        de quien la inició; se cancela upstream sólo si todos los interesados se van.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = [asyncio.ensure_future(make()), 0]
+            self._flights[key] = flight
+            flight[0].add_done_callback(
+                lambda _t, f=flight: self._flights.pop(key) if self._flights.get(key) is f else None
+            )
+        else:
+            self.coalesced += 1
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        except asyncio.CancelledError:
+            if flight[1] == 1:
+                flight[0].cancel()  # último interesado: avisa al server (notifications/cancelled)
+                if self._flights.get(key) is flight:
+                    del self._flights[key]  # quien llegue ahora abre una llamada nueva
+            raise
+        finally:
+            flight[1] -= 1
+
+    async def _broadcast(self, name: str, arguments: Dict[str, Any], on_progress, timeout) -> Dict[str, Any]:
+        first = await self._pick()
+        targets = [first] + [i for i in range(self.size) if i != first and self._usable(i)]
+        results = await asyncio.gather(
+            *(self._on(i, lambda m, k=k: m.acall(
+                name, arguments, on_progress=on_progress if k == 0 else None, timeout=timeout))
+              for k, i in enumerate(targets)),
+            return_exceptions=True,
+        )
+        ok = [r for r in results if not isinstance(r, BaseException) and "error" not in r]
+        if not ok:
+            if isinstance(results[0], BaseException):
+                raise results[0]
+            return results[0]
+        # Aplicada en al menos uno: entra al replay y los que fallaron se re-sincronizan
+        self._replay = (self._replay + [(name, arguments)])[-100:]
+        for i, r in zip(targets, results):
+            if isinstance(r, BaseException) or "error" in r:
+                self._stale.add(i)
+                self._restart_soon(i)
+        return results[0] if results[0] is ok[0] else ok[0]
+
+    async def acall_many(
+        self, calls: List[Tuple[str, Dict[str, Any]]],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Reparte el batch entre los miembros vivos (round-robin) y lo re-arma en orden.
+        Si incluye tools `broadcast`, se ejecuta en serie para no desincronizar estado.
+        """
+        if not calls:
+            return []
+        if self.size > 1 and any(name in self.broadcast for name, _ in calls):
+            out: List[Dict[str, Any]] = []
+            for name, args in calls:
+                try:
+                    out.append(await self.acall(name, args, on_progress=on_progress, timeout=timeout))
+                except Exception as e:
+                    out.append({"jsonrpc": "2.0", "id": None, "error": {"code": -32603, "message": str(e)}})
+            return out
+
+        first = await self._pick()
+        live = [first] + [i for i in range(self.size) if i != first and self._usable(i)]
+        shares: Dict[int, List[int]] = {}
+        for k in range(len(calls)):
+            shares.setdefault(live[k % len(live)], []).append(k)
+        parts = await asyncio.gather(*(
+            self._on(i, lambda m, idx=idx: m.acall_many([calls[k] for k in idx], on_progress=on_progress, timeout=timeout))
+            for i, idx in shares.items()
+        ), return_exceptions=True)
+        out = [None] * len(calls)
+        for idx, part in zip(shares.values(), parts):
+            if isinstance(part, BaseException) and not isinstance(part, Exception):
+                raise part  # cancelación: no es un error por ítem
+            for n, k in enumerate(idx):
+                # un miembro caído no tumba el batch: error por ítem, como en la rama en serie
+                out[k] = (
+                    {"jsonrpc": "2.0", "id": None, "error": {"code": -32603, "message": str(part)}}
+                    if isinstance(part, Exception) else part[n]
+                )
+        return out  # type: ignore[return-value]
+
+    async def aclose(self):
+        if self._health:
+            self._health.cancel()
+            self._health = None
+        await asyncio.gather(*(m.aclose() for m in self.members), return_exceptions=True)
+
+    # ---- API síncrona (fachada) ----
+    def list_tools(self) -> Dict[str, Any]:
+        return run_sync(self.alist_tools())
+
+    def call(
+        self, name: str, arguments: Dict[str, Any],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        return run_sync(self.acall(name, arguments, on_progress=on_progress, timeout=timeout))
+
+    def call_many(
+        self, calls: List[Tuple[str, Dict[str, Any]]],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        return run_sync(self.acall_many(calls, on_progress=on_progress, timeout=timeout))
+
+    def close(self):
+        run_sync(self.aclose())
+
+
+def _args_key(arguments: Dict[str, Any]) -> str:
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def connect_servers(
+    names: List[str],
+    config_path: str = "mcp_config.json",
+    timeout: float = 20.0,
+    lazy: bool = False,
+    catalog: Optional[ToolCatalog] = None,
+    broker: bool = False,
+) -> Tuple[Dict[str, ServerPool], List[str], List[str]]:
+    """
+    Crea un ServerPool por servidor y hace todos los handshakes en paralelo,
+    cada uno con su timeout ("connect_timeout" en mcp_config.json o `timeout`).
+    Con lazy=True no conecta nada: cada servidor se conecta en su primera llamada.
+    `catalog` (compartido) cachea tools/list de todos los servidores.
+    `broker`: los servers stdio van por el broker local (ver src/mcp/broker.py).
+    Devuelve (clients, ok, fail) con fail como ["Nombre → error", ...].
+    """
+    clients: Dict[str, ServerPool] = {}
+    fail: List[str] = []
+    for name in names:
+        try:
+            clients[name] = ServerPool(
+                config_path=config_path, server_name=name, lazy=True, catalog=catalog, via_broker=broker,
+            )
+        except Exception as e:
+            fail.append(f"{name} → {e}")
+    if lazy:
+        return clients, list(clients), fail
+
+    async def _connect(c: ServerPool):
+        limit = float(c.config.get("connect_timeout", timeout))
+        try:
+            await asyncio.wait_for(c.aconnect(), limit)
+        except asyncio.TimeoutError:
+            await c.aclose()
+            raise TimeoutError(f"sin respuesta a initialize tras {limit:g}s")
+        except BaseException:
+            await c.aclose()
+            raise
+
+    async def _connect_all():
+        return await asyncio.gather(*(_connect(c) for c in clients.values()), return_exceptions=True)
+
+    ok: List[str] = []
+    for (name, c), res in zip(list(clients.items()), run_sync(_connect_all())):
+        if isinstance(res, BaseException):
+            del clients[name]
+            fail.append(f"{name} → {res}")
+        else:
+            ok.append(name)
+    return clients, ok, fail
@@ -121,8 +121,8 @@ def import_remote_tools(clients: Dict[str, MCPClient], openai_tools: List[Dict[s
         return set(), {}
 
     client = clients["anime-helper"]
-    listed = client.list_tools()  # {"tools":[{"name":"search_media", ...}, ...]}
-    names = [t.get("name") for t in (listed.get("tools") or []) if isinstance(t, dict)]
+    listed = client.list_tools()  # {"result": {"tools":[{"name":"search_media", ...}, ...]}}
+    names = [t.get("name") for t in ((listed.get("result") or {}).get("tools") or []) if isinstance(t, dict)]
 
     safe_names: Set[str] = set()
     mapping: Dict[str, str] = {}
@@ -0,0 +1,61 @@
+# src/services/generic.py
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+# OpenAI exige ^[a-zA-Z0-9_-]{1,64}$ en function.name
+_MAX_NAME = 64
+
+
+def _safe_name(server: str, remote_name: str) -> str:
+    """'Weather' + 'forecast.daily' -> 'weather__forecast_daily' (recortado a 64)."""
+    prefix = re.sub(r"[^a-zA-Z0-9_]", "_", server).lower()
+    return (prefix + "__" + re.sub(r"[^a-zA-Z0-9_]", "_", remote_name))[:_MAX_NAME]
+
+
+def import_remote_tools(
+    server: str,
+    clients: Dict[str, Any],
+    openai_tools: List[Dict[str, Any]],
+) -> Tuple[Set[str], Dict[str, str]]:
+    """
+    Importador genérico para cualquier servidor de mcp_config.json sin módulo propio:
+    toma nombre, descripción e inputSchema tal como los publica el server.
+    Devuelve (safe_names, {safe -> remote}) igual que los importadores específicos.
+    """
+    safe_names: Set[str] = set()
+    mapping: Dict[str, str] = {}
+
+    if server not in clients:
+        return safe_names, mapping
+
+    try:
+        res = clients[server].list_tools()
+        tools = (res.get("result") or {}).get("tools", [])
+    except Exception:
+        return safe_names, mapping
+
+    for t in tools:
+        if not isinstance(t, dict):
+            continue
+        remote_name = t.get("name")
+        if not remote_name or not isinstance(remote_name, str):
+            continue
+
+        safe = _safe_name(server, remote_name)
+        if safe in mapping or any(isinstance(x, dict) and x.get("function", {}).get("name") == safe for x in openai_tools):
+            continue
+
+        safe_names.add(safe)
+        mapping[safe] = remote_name
+        openai_tools.append({
+            "type": "function",
+            "function": {
+                "name": safe,
+                "description": f"[{server}] {t.get('description') or remote_name}",
+                "parameters": t.get("inputSchema") or {"type": "object", "properties": {}, "required": []},
+            }
+        })
+
+    return safe_names, mapping
@@ -0,0 +1,57 @@
+# src/utils/codec.py
+"""
+Codec JSON del host: usa orjson si está instalado y cae a la stdlib si no.
+Todo sale en UTF-8 sin escapar (equivalente a ensure_ascii=False).
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson  # opcional: pip install orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto en bytes UTF-8."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:  # claves no-str, ints gigantes, etc.
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_line(obj: Any) -> bytes:
+    """JSON compacto + '\\n' (framing JSON-RPC por líneas / JSONL)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass
+    return dumps(obj) + b"\n"
+
+
+def dumps_str(obj: Any, indent: bool = False) -> str:
+    """JSON como str; indent=True usa 2 espacios (lo que ve el usuario con :raw)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except TypeError:
+            pass
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decodifica JSON desde bytes o str (ValueError si es inválido)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
@@ -1,5 +1,14 @@
-import json
-from typing import Any, Dict, List
+import csv, io, itertools
+from typing import Any, Callable, Dict, List, Tuple
+
+from .codec import dumps_str
+
+# Formatos del contenido que recibe el modelo:
+#   markdown  tabla Markdown / JSON indentado (original)
+#   tsv, csv  encabezado + una fila por objeto
+#   json      JSON compacto; listas de objetos como {"columns": [...], "rows": [[...]]}
+FORMATS = ("markdown", "tsv", "csv", "json")
+
 
 def table_from_result(result: Dict[str, Any]) -> str:
     """Convierte respuestas de tools a tabla Markdown simple cuando se pueda."""
@@ -12,7 +21,7 @@ def table_from_result(result: Dict[str, Any]) -> str:
             sep  = "| " + " | ".join("---" for _ in headers) + " |"
             rows = ["| " + " | ".join(str(r.get(h, "")) for h in headers) + " |" for r in data]
             return "\n".join([head, sep] + rows)
-        return json.dumps(data, ensure_ascii=False, indent=2)
+        return dumps_str(data, indent=True)
 
     parts = result.get("content", [])
     if isinstance(parts, list):
@@ -21,4 +30,71 @@ def table_from_result(result: Dict[str, Any]) -> str:
             return "\n".join(texts)
 
     # fallback
-    return json.dumps(result, ensure_ascii=False, indent=2)
+    return dumps_str(result, indent=True)
+
+
+def pick_format(formats: Dict[str, str], tool: str) -> str:
+    """Formato de una tool: el suyo, si no el global ("*"), si no markdown."""
+    return formats.get(tool) or formats.get("*") or "markdown"
+
+
+def columns_of(rows: List[Any]) -> List[str]:
+    """Unión de claves de las filas, en orden de aparición."""
+    return list(dict.fromkeys(itertools.chain.from_iterable(r.keys() for r in rows if isinstance(r, dict))))
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else dumps_str(value)
+
+
+def row_encoder(fmt: str, columns: List[str]) -> Tuple[List[str], Callable[[Dict[str, Any]], str]]:
+    """(líneas de encabezado, fila → línea) para codificar una tabla fila a fila."""
+    if fmt == "tsv":
+        clean = lambda v: " ".join(_cell(v).split())  # sin tabs ni saltos dentro de la celda
+        return ["\t".join(columns)], lambda r: "\t".join(clean(r.get(c)) for c in columns)
+    if fmt == "csv":
+        def line(values: List[str]) -> str:
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="").writerow(values)
+            return buf.getvalue()
+        return [line(columns)], lambda r: line([_cell(r.get(c)) for c in columns])
+    if fmt == "json":
+        return ["columns: " + dumps_str(columns)], lambda r: dumps_str([r.get(c) for c in columns])
+    esc = lambda v: _cell(v).replace("|", "\\|")
+    head = ["| " + " | ".join(columns) + " |", "| " + " | ".join("---" for _ in columns) + " |"]
+    return head, lambda r: "| " + " | ".join(esc(r.get(c)) for c in columns) + " |"
+
+
+def _columnar(data: Any) -> Any:
+    """Listas de objetos → {"columns", "rows"}: cada clave se escribe una sola vez."""
+    if isinstance(data, list):
+        if len(data) > 1 and all(isinstance(r, dict) for r in data):
+            cols = columns_of(data)
+            return {"columns": cols, "rows": [[_columnar(r.get(c)) for c in cols] for r in data]}
+        return [_columnar(v) for v in data]
+    if isinstance(data, dict):
+        return {k: _columnar(v) for k, v in data.items()}
+    return data
+
+
+def encode_result(result: Dict[str, Any], fmt: str = "markdown") -> str:
+    """Como table_from_result, pero en el formato pedido (ver FORMATS)."""
+    if fmt not in ("tsv", "csv", "json"):
+        return table_from_result(result)
+    sc = result.get("structuredContent", {})
+    if sc and "result" in sc:
+        data = sc["result"]
+        if fmt != "json" and isinstance(data, list) and data and all(isinstance(r, dict) for r in data):
+            head, enc = row_encoder(fmt, columns_of(data))
+            return "\n".join(head + [enc(r) for r in data])
+        return dumps_str(_columnar(data))
+
+    parts = result.get("content", [])
+    if isinstance(parts, list):
+        texts = [p.get("text","") for p in parts if isinstance(p, dict) and p.get("type")=="text"]
+        if texts:
+            return "\n".join(texts)
+
+    return dumps_str(result)
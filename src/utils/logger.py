@@ -1,12 +1,12 @@
 # src/utils/logger.py
 from __future__ import annotations
 
-import json
 import os
 import time
 from typing import Any, Dict
 
 from ..core.config import settings
+from . import codec
 
 class JSONLLogger:
     def __init__(self, path: str | None = None):
@@ -16,5 +16,5 @@ class JSONLLogger:
 
     def log(self, event: Dict[str, Any]):
         event = {"ts": time.time(), **event}
-        with open(self.path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        with open(self.path, "ab") as f:
+            f.write(codec.dumps_line(event))
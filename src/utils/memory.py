@@ -1,11 +1,130 @@
-from typing import List, Dict
+from __future__ import annotations
+
+import concurrent.futures, threading
+from typing import Callable, Dict, List, Optional
+
+from .tokens import message_tokens
+
+# summarize(resumen_previo, mensajes_viejos) -> resumen nuevo
+Summarizer = Callable[[str, List[Dict]], str]
+
+# Un par de hilos para todas las sesiones: compactar nunca bloquea un turno
+_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+_SUMMARY_HEADER = "Resumen de la conversación anterior (turnos ya compactados):\n"
+
+
+def extractive_summary(previous: str, messages: List[Dict], limit: int = 1600) -> str:
+    """Resumen sin LLM (fallback): una línea recortada por mensaje, lo más nuevo al final."""
+    lines = [previous] if previous else []
+    for m in messages:
+        text = " ".join(str(m.get("content") or "").split())
+        if text:
+            lines.append(f"- {m['role']}: {text[:200]}")
+    out = "\n".join(lines)
+    return out[-limit:]
+
 
 class Memory:
-    def __init__(self):
+    """
+    Historial del chat. Con `budget` > 0 (tokens estimados, cacheados al insertar) se
+    mantiene acotado: los mensaje(s) de sistema iniciales quedan fijos y, al pasarse,
+    los turnos más viejos salen del historial (hasta ~`low_water` del presupuesto, para
+    no compactar en cada turno) y se resumen en segundo plano con `summarize`; el
+    resumen entra en `dump()` como un mensaje de sistema. Así el costo del prompt por
+    turno queda plano aunque la sesión sea larga. Siempre se conservan los últimos
+    `keep` mensajes. Se evictan turnos enteros (usuario + asistente con tool_calls +
+    resultados `tool`), así nunca queda un asistente o `tool` huérfano al principio.
+    budget=0: sin límite (comportamiento original).
+    """
+
+    def __init__(
+        self, budget: int = 0, summarize: Optional[Summarizer] = None,
+        keep: int = 2, low_water: float = 0.75,
+    ):
         self.messages: List[Dict] = []
+        self._tokens: List[int] = []
+        self.budget = budget
+        self.summarize = summarize
+        self.keep = keep
+        self.low_water = low_water
+        self.summary = ""
+        self._summary_tokens = 0
+        self.compacted = 0                 # mensajes que ya salieron del historial
+        self._pinned = 0                   # mensajes de sistema iniciales
+        self._pending: List[Dict] = []     # esperando a entrar al resumen
+        self._busy = False
+        self._lock = threading.Lock()
 
-    def add(self, role: str, content: str):
-        self.messages.append({"role": role, "content": content})
+    def add(self, role: str, content: Optional[str], **extra):
+        """`extra`: campos del mensaje tal cual (tool_calls, tool_call_id, name)."""
+        msg = {"role": role, "content": content, **extra}
+        with self._lock:
+            self.messages.append(msg)
+            self._tokens.append(message_tokens(msg))
+            if role == "system" and self._pinned == len(self.messages) - 1:
+                self._pinned += 1
+            if self.budget > 0 and self._total() > self.budget:
+                self._evict()
 
     def dump(self) -> List[Dict]:
-        return list(self.messages)
+        with self._lock:
+            head = self.messages[:self._pinned]
+            if self.summary:
+                head = head + [{"role": "system", "content": _SUMMARY_HEADER + self.summary}]
+            return head + self.messages[self._pinned:]
+
+    @property
+    def tokens(self) -> int:
+        """Tokens estimados de lo que devuelve dump()."""
+        with self._lock:
+            return self._total()
+
+    # ---- compactación ----
+    def _total(self) -> int:
+        return sum(self._tokens) + self._summary_tokens
+
+    def _evict(self):
+        """Saca turnos viejos enteros (desde un mensaje de usuario hasta el siguiente) y encola su resumen."""
+        target = int(self.budget * self.low_water)
+        last = len(self.messages) - self.keep
+        total = self._total()
+        cut = i = self._pinned
+        while i < last and total > target:
+            total -= self._tokens[i]
+            i += 1
+            # completar el turno: asistente con tool_calls y sus resultados `tool` salen juntos
+            while i < last and self.messages[i]["role"] != "user":
+                total -= self._tokens[i]
+                i += 1
+            # solo se corta antes de un mensaje de usuario (o al final): lo que queda empieza un turno
+            if i == len(self.messages) or self.messages[i]["role"] == "user":
+                cut = i
+        if cut == self._pinned:
+            return
+        self._pending.extend(self.messages[self._pinned:cut])
+        self.compacted += cut - self._pinned
+        del self.messages[self._pinned:cut]
+        del self._tokens[self._pinned:cut]
+        if not self._busy:
+            self._busy = True
+            _POOL.submit(self._compact)
+
+    def _compact(self):
+        """En un hilo aparte: funde en el resumen todo lo pendiente (en orden)."""
+        while True:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                previous = self.summary
+                if not batch:
+                    self._busy = False
+                    return
+            try:
+                summary = self.summarize(previous, batch) if self.summarize else ""
+            except Exception:
+                summary = ""
+            if not summary.strip():
+                summary = extractive_summary(previous, batch)
+            with self._lock:
+                self.summary = summary.strip()
+                self._summary_tokens = message_tokens({"content": _SUMMARY_HEADER + self.summary})
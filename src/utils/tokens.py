@@ -0,0 +1,44 @@
+# src/utils/tokens.py
+"""
+Estimación de tokens de mensajes de chat: tiktoken si está instalado (opcional:
+pip install tiktoken), si no ≈ bytes UTF-8 / 4. Sirve para presupuestar, no para facturar.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+
+from . import codec
+
+_ENCODE: Optional[Callable[[str], list]] = None
+_LOADED = False
+
+# Overhead por mensaje del formato chat (rol + separadores)
+_PER_MESSAGE = 4
+
+
+def _encoder() -> Optional[Callable[[str], list]]:
+    global _ENCODE, _LOADED
+    if not _LOADED:
+        _LOADED = True
+        try:
+            import tiktoken
+            _ENCODE = tiktoken.get_encoding("o200k_base").encode
+        except Exception:  # no instalado o sin el archivo del encoding
+            _ENCODE = None
+    return _ENCODE
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoder()
+    if enc is not None:
+        return len(enc(text))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def message_tokens(msg: Dict[str, Any]) -> int:
+    n = _PER_MESSAGE + count_tokens(msg.get("content") or "")
+    if msg.get("tool_calls"):
+        n += count_tokens(codec.dumps_str(msg["tool_calls"]))
+    return n
@@ -0,0 +1,154 @@
+# tests/bench_result_format.py
+"""
+Benchmark de formatos de resultados de tools (HOST_RESULT_FORMAT).
+
+    python -m tests.bench_result_format [--results .cache/tool_results.jsonl] [--live 5]
+
+Codifica cada resultado grabado en markdown (camino actual), tsv, csv y json columnar,
+y compara tokens (tiktoken si está instalado, si no ≈ bytes/4) y costo de codificar.
+Con `--live N` además mide la latencia real de N completions (max_tokens=1) con el
+resultado como mensaje `tool`, por formato (requiere .env con OPENAI_API_KEY).
+
+`--results` es un JSONL con una respuesta MCP por línea, {"tool": ..., "response": {...}}
+(p. ej. lo que muestra :raw). Si no existe se usan muestras con la forma de las
+respuestas de FS, Git, SQLScout, SiteLens y anime-helper.
+"""
+from __future__ import annotations
+
+import argparse, os, statistics, time
+from typing import Any, Dict, List, Tuple
+
+from src.utils.jsonfmt import FORMATS, encode_result
+from src.utils import codec
+
+
+def _structured(data: Any) -> Dict[str, Any]:
+    return {"result": {"structuredContent": {"result": data}, "content": [{"type": "text", "text": codec.dumps_str(data)}]}}
+
+
+def samples() -> List[Tuple[str, Dict[str, Any]]]:
+    files = [
+        {"name": f"src/{d}/{n}.py", "type": "file", "size": 1200 + 37 * i, "modified": f"2025-09-{1 + i % 28:02d}T10:{i % 60:02d}:00Z"}
+        for i, (d, n) in enumerate((d, n) for d in ("core", "mcp", "utils", "services") for n in ("agent", "client", "codec", "registry", "memory", "router", "ui", "config"))
+    ]
+    commits = [
+        {"hash": f"{0x9de852a + i * 7919:07x}", "author": ("ana", "luis", "gabriel")[i % 3],
+         "date": f"2025-09-{1 + i % 28:02d}", "subject": f"Ajusta el manejo de errores del paso {i} en el host"}
+        for i in range(40)
+    ]
+    sql = [
+        {"id": i, "email": f"user{i}@example.com", "country": ("GT", "MX", "SV", "HN")[i % 4],
+         "created_at": f"2025-0{1 + i % 9}-15", "orders": i % 17, "total": round(13.5 * (i % 23), 2), "active": i % 5 != 0}
+        for i in range(60)
+    ]
+    report = {
+        "root": "site", "score": 72,
+        "quickWins": ["Agregar alt a imágenes", "Etiquetar inputs del formulario"],
+        "issues": [
+            {"rule": ("img-alt", "label", "heading-order", "landmark")[i % 4], "severity": ("high", "medium", "low")[i % 3],
+             "file": f"pages/p{i % 9}.html", "line": 10 + i, "message": "Elemento sin texto alternativo o etiqueta accesible"}
+            for i in range(45)
+        ],
+    }
+    anime = [
+        {"id": 5114 + i, "title": f"Serie {i}", "type": "TV", "episodes": 12 + i % 13, "score": round(7 + (i % 20) / 10, 2),
+         "genres": ["Action", "Drama"][: 1 + i % 2], "year": 2000 + i % 24}
+        for i in range(25)
+    ]
+    return [
+        ("fs_list", _structured(files)),
+        ("git_log_here", _structured(commits)),
+        ("sql_explain", _structured(sql)),
+        ("sitelens__aa_report", _structured(report)),
+        ("anime__search_media", _structured(anime)),
+    ]
+
+
+def load_results(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    if not os.path.exists(path):
+        return samples()
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                e = codec.loads(line)
+            except ValueError:
+                continue
+            if isinstance(e, dict) and isinstance(e.get("response"), dict):
+                out.append((e.get("tool") or "?", e["response"]))
+    return out
+
+
+def _counter():
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("o200k_base")
+        return "tiktoken", lambda s: len(enc.encode(s))
+    except Exception:
+        return "≈bytes/4", lambda s: len(s.encode("utf-8")) // 4
+
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def live(results: List[Tuple[str, Dict[str, Any]]], n: int):
+    from src.core.openai_client import build_openai_client
+    client, model = build_openai_client()
+    times: Dict[str, List[float]] = {f: [] for f in FORMATS}
+    for tool, resp in results[:n]:
+        call = {"id": "call_1", "type": "function", "function": {"name": tool, "arguments": "{}"}}
+        tools = [{"type": "function", "function": {"name": tool, "parameters": {"type": "object", "properties": {}}}}]
+        for fmt in FORMATS:
+            messages = [
+                {"role": "user", "content": f"Resume el resultado de {tool}."},
+                {"role": "assistant", "content": None, "tool_calls": [call]},
+                {"role": "tool", "tool_call_id": "call_1", "content": encode_result(resp.get("result", resp), fmt)},
+            ]
+            t0 = time.perf_counter()
+            client.chat.completions.create(model=model, messages=messages, tools=tools, max_tokens=1)
+            times[fmt].append(time.perf_counter() - t0)
+    print(f"\nlatencia OpenAI ({model}, {len(times['markdown'])} resultados, max_tokens=1):")
+    for fmt, ts in times.items():
+        print(f"  {fmt:9s}  media {statistics.mean(ts)*1000:7.0f} ms   p50 {_pct(ts, .5)*1000:7.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de formatos de resultados de tools")
+    ap.add_argument("--results", default=".cache/tool_results.jsonl")
+    ap.add_argument("--repeat", type=int, default=200, help="repeticiones para medir el costo de codificar")
+    ap.add_argument("--live", type=int, default=0, help="N resultados a medir contra la API real")
+    a = ap.parse_args()
+
+    results = load_results(a.results)
+    if not results:
+        print(f"Sin resultados en {a.results}")
+        return
+    how, count = _counter()
+    toks: Dict[str, List[int]] = {f: [] for f in FORMATS}
+    cost: Dict[str, List[float]] = {f: [] for f in FORMATS}
+    for _tool, resp in results:
+        result = resp.get("result", resp)
+        for fmt in FORMATS:
+            toks[fmt].append(count(encode_result(result, fmt)))
+            t0 = time.perf_counter()
+            for _ in range(a.repeat):
+                encode_result(result, fmt)
+            cost[fmt].append((time.perf_counter() - t0) / a.repeat)
+
+    base = sum(toks["markdown"])
+    print(f"{len(results)} resultados · tokens: {how} · codec: {codec.BACKEND}")
+    print(f"  {'formato':9s} {'tokens':>8s} {'vs md':>7s}   codificar p50")
+    for fmt in FORMATS:
+        total = sum(toks[fmt])
+        print(f"  {fmt:9s} {total:8d} {100 * (total / base - 1):+6.0f}%   {_pct(cost[fmt], .5)*1e6:8.0f} µs")
+    print("\npor resultado (tokens):")
+    for i, (tool, _resp) in enumerate(results):
+        print(f"  {tool[:28]:28s} " + "  ".join(f"{fmt} {toks[fmt][i]:6d}" for fmt in FORMATS))
+    if a.live:
+        live(results, a.live)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# tests/bench_tool_selection.py
+"""
+Benchmark de selección de tools por turno (ToolSelector, BM25 + top-k).
+
+    python -m tests.bench_tool_selection [--log history/chat_log.jsonl] [--top-k 8] [--live 10]
+
+Re-juega los prompts de `history/chat_log.jsonl` y compara, por turno, el payload de
+`tools` completo contra el subconjunto elegido: tokens (tiktoken si está instalado,
+si no ≈ bytes/4), cuántas tools se mandan, cuántas veces cae al fallback y el costo
+del ranking. Con `--live N` además mide la latencia real de N completions (max_tokens=1)
+con la lista completa vs el subconjunto (requiere .env con OPENAI_API_KEY).
+
+El catálogo sale del snapshot `.cache/tool_catalog.json` si existe; si no, de los
+esquemas estáticos de anime-helper / RemoteMCP y la lista documentada de SiteLens.
+"""
+from __future__ import annotations
+
+import argparse, json, os, statistics, time
+from typing import Any, Dict, List
+
+from src.core.openai_client import OPENAI_TOOLS
+from src.core.toolselect import ToolSelector
+from src.services import anime_helper, remotemcp, sitelens
+from src.utils import codec
+
+# tests/README_MCP_SiteLens.md
+SITELENS = {
+    "aa.allowed_roots": "Lista de roots permitidas.",
+    "aa.sitemap": "Árbol de archivos (opciones includeHtmlOnly, maxDepth).",
+    "aa.link_check": "Valida links internos (externos status skipped).",
+    "aa.asset_budget": "Resumen de assets (totales, top pesados, sobre presupuesto).",
+    "aa.scan_accessibility": "Reglas WCAG-lite: alt text, labels, landmarks, headings order, contraste inline simple.",
+    "aa.report": "Consolida lo anterior (ranking 0–100 y quick wins).",
+}
+
+
+def _fn(name: str, desc: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "function", "function": {"name": name, "description": desc, "parameters": params}}
+
+
+def build_tools(cache_path: str) -> List[Dict[str, Any]]:
+    tools = list(OPENAI_TOOLS)
+    snap: Dict[str, Any] = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            snap = codec.loads(f.read())
+
+    def remote(server: str) -> List[Dict[str, Any]]:
+        return (snap.get(server) or {}).get("tools") or []
+
+    for t in remote("SiteLens") or [{"name": n, "description": d} for n, d in SITELENS.items()]:
+        params = t.get("inputSchema") or {"type": "object", "properties": {"path": {"type": "string"}}, "required": []}
+        tools.append(_fn(sitelens._safe_name(t["name"]), f"[SiteLens] {t.get('description', '')}", params))
+    for name in [t["name"] for t in remote("anime-helper")] or list(anime_helper.SCHEMAS):
+        tools.append(_fn(anime_helper._safe_name(name), anime_helper.DESC.get(name, ""),
+                         anime_helper.SCHEMAS.get(name, {"type": "object", "properties": {}})))
+    for name in [t["name"] for t in remote("RemoteMCP")] or list(remotemcp.SCHEMAS):
+        tools.append(_fn(remotemcp._safe(name), remotemcp.DESCS.get(name, ""),
+                         remotemcp.SCHEMAS.get(name, {"type": "object", "properties": {}})))
+    return tools
+
+
+def _counter():
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("o200k_base")
+        return "tiktoken", lambda s: len(enc.encode(s))
+    except Exception:
+        return "≈bytes/4", lambda s: len(s.encode("utf-8")) // 4
+
+
+def load_prompts(path: str) -> List[str]:
+    out: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue
+            if e.get("event") in ("chat", "chat+tools") and e.get("user"):
+                out.append(e["user"])
+    return out
+
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def live(prompts: List[str], tools: List[Dict[str, Any]], sel: ToolSelector, n: int):
+    from src.core.openai_client import build_openai_client
+    client, model = build_openai_client()
+    full_t: List[float] = []
+    sub_t: List[float] = []
+    for p in prompts[:n]:
+        for subset, acc in ((tools, full_t), (sel.select(p), sub_t)):
+            t0 = time.perf_counter()
+            client.chat.completions.create(
+                model=model, messages=[{"role": "user", "content": p}],
+                tools=subset, tool_choice="auto", max_tokens=1,
+            )
+            acc.append(time.perf_counter() - t0)
+    print(f"\nlatencia OpenAI ({model}, {len(full_t)} prompts, max_tokens=1):")
+    print(f"  completo   media {statistics.mean(full_t)*1000:7.0f} ms   p50 {_pct(full_t, .5)*1000:7.0f} ms")
+    print(f"  top-k      media {statistics.mean(sub_t)*1000:7.0f} ms   p50 {_pct(sub_t, .5)*1000:7.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de selección de tools por turno")
+    ap.add_argument("--log", default="history/chat_log.jsonl")
+    ap.add_argument("--cache", default=".cache/tool_catalog.json")
+    ap.add_argument("--top-k", type=int, default=8)
+    ap.add_argument("--min-score", type=float, default=2.0)
+    ap.add_argument("--live", type=int, default=0, help="N prompts a medir contra la API real")
+    a = ap.parse_args()
+
+    tools = build_tools(a.cache)
+    prompts = load_prompts(a.log)
+    sel = ToolSelector(tools, top_k=a.top_k, min_score=a.min_score)
+    how, count = _counter()
+    full = count(json.dumps(tools, ensure_ascii=False))
+
+    sent: List[int] = []
+    toks: List[int] = []
+    cost: List[float] = []
+    fallback = 0
+    for p in prompts:
+        t0 = time.perf_counter()
+        subset = sel.select(p)
+        cost.append(time.perf_counter() - t0)
+        sent.append(len(subset))
+        toks.append(count(json.dumps(subset, ensure_ascii=False)))
+        fallback += len(subset) == len(tools)
+
+    mean_toks = statistics.mean(toks)
+    print(f"{len(prompts)} prompts · {len(tools)} tools en el catálogo · tokens: {how}")
+    print(f"  tools/turno      completo {len(tools):5d}   top-k media {statistics.mean(sent):5.1f}")
+    print(f"  tokens tools     completo {full:5d}   top-k media {mean_toks:7.1f}  (-{100 * (1 - mean_toks / full):.0f}%)")
+    print(f"  fallback         {fallback}/{len(prompts)} turnos con la lista completa")
+    print(f"  ranking          p50 {_pct(cost, .5)*1e6:.0f} µs   p95 {_pct(cost, .95)*1e6:.0f} µs")
+    if a.live:
+        live(prompts, tools, sel, a.live)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# tests/stub_streamable_mcp.py
+"""
+Servidor MCP de prueba (streamable-HTTP) sin dependencias externas.
+
+    python tests/stub_streamable_mcp.py --port 8770
+
+- POST /mcp con `Accept: text/event-stream` → responde SSE (progreso + resultado).
+- POST /mcp sin SSE en Accept                → responde JSON plano.
+- Asigna `Mcp-Session-Id` en initialize; DELETE /mcp cierra la sesión.
+
+Tools:
+- stub.echo {text}                      → eco inmediato.
+- stub.countdown {n=5, delay=0.5}       → emite n `notifications/progress` y luego el resultado.
+"""
+from __future__ import annotations
+
+import argparse, json, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional
+
+SESSIONS: set = set()
+
+TOOLS = [
+    {
+        "name": "stub.echo",
+        "description": "Eco inmediato del texto recibido.",
+        "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+    },
+    {
+        "name": "stub.countdown",
+        "description": "Cuenta regresiva con notificaciones de progreso.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "n": {"type": "integer", "default": 5},
+                "delay": {"type": "number", "default": 0.5},
+            },
+            "required": [],
+        },
+    },
+]
+
+
+def _result(rid: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": rid, "result": result}
+
+
+def _text(text: str) -> Dict[str, Any]:
+    return {"content": [{"type": "text", "text": text}]}
+
+
+def _handle(msg: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Genera los mensajes a enviar (notificaciones primero, respuesta al final)."""
+    rid, method, params = msg.get("id"), msg.get("method"), msg.get("params") or {}
+    if method == "initialize":
+        yield _result(rid, {
+            "protocolVersion": params.get("protocolVersion", "2024-11-05"),
+            "serverInfo": {"name": "stub-streamable", "version": "1.0"},
+            "capabilities": {"tools": {"listChanged": False}},
+        })
+    elif method == "ping":
+        yield _result(rid, {})
+    elif method == "tools/list":
+        yield _result(rid, {"tools": TOOLS})
+    elif method == "tools/call":
+        name, args = params.get("name"), params.get("arguments") or {}
+        token = (params.get("_meta") or {}).get("progressToken")
+        if name == "stub.echo":
+            yield _result(rid, _text(str(args.get("text", ""))))
+        elif name == "stub.countdown":
+            n, delay = int(args.get("n", 5)), float(args.get("delay", 0.5))
+            for i in range(1, n + 1):
+                time.sleep(delay)
+                if token is not None:
+                    yield {"jsonrpc": "2.0", "method": "notifications/progress",
+                           "params": {"progressToken": token, "progress": i, "total": n, "message": f"paso {i}/{n}"}}
+            yield _result(rid, {**_text(f"cuenta terminada ({n})"), "structuredContent": {"result": list(range(n, 0, -1))}})
+        else:
+            yield {"jsonrpc": "2.0", "id": rid, "error": {"code": -32602, "message": f"Tool desconocida: {name}"}}
+    else:
+        yield {"jsonrpc": "2.0", "id": rid, "error": {"code": -32601, "message": f"Método no soportado: {method}"}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _session(self) -> Optional[str]:
+        return self.headers.get("Mcp-Session-Id")
+
+    def _send_json(self, status: int, body: Any, sid: Optional[str] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if sid:
+            self.send_header("Mcp-Session-Id", sid)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        msg = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if isinstance(msg, list):
+            self._send_json(200, [m for item in msg if "id" in item for m in _handle(item) if "id" in m])
+            return
+
+        sid = self._session()
+        if msg.get("method") == "initialize":
+            sid = uuid.uuid4().hex
+            SESSIONS.add(sid)
+        elif sid not in SESSIONS:
+            self._send_json(404, {"error": "sesión desconocida"})
+            return
+
+        if "id" not in msg:  # notificación
+            self.send_response(202)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if "text/event-stream" not in (self.headers.get("Accept") or ""):
+            self._send_json(200, [m for m in _handle(msg) if "id" in m][-1], sid)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Mcp-Session-Id", sid)
+        self.end_headers()
+        for out in _handle(msg):
+            self._chunk(f"event: message\ndata: {json.dumps(out)}\n\n".encode("utf-8"))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_DELETE(self):
+        SESSIONS.discard(self._session())
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor MCP streamable-HTTP de prueba")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8770)
+    a = ap.parse_args()
+    print(f"stub-streamable escuchando en http://{a.host}:{a.port}/mcp")
+    ThreadingHTTPServer((a.host, a.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
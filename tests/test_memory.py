@@ -0,0 +1,24 @@
+# tests/test_memory.py
+"""Memoria acotada: se evictan turnos enteros, nunca queda un asistente o `tool` huérfano."""
+from __future__ import annotations
+
+from src.utils.memory import Memory
+
+
+def _turno(memory: Memory, n: int):
+    memory.add("user", "pregunta " * 10)
+    memory.add("assistant", None, tool_calls=[{"id": f"c{n}", "type": "function", "function": {"name": "fs_list", "arguments": "{}"}}])
+    memory.add("tool", "resultado " * 10, tool_call_id=f"c{n}")
+    memory.add("assistant", "respuesta " * 10)
+
+
+def test_evicta_turnos_completos():
+    for keep in (1, 2, 3):
+        memory = Memory(budget=120, keep=keep, summarize=lambda previous, batch: "resumen")
+        memory.add("system", "sys")
+        for n in range(8):
+            _turno(memory, n)
+            rest = memory.messages[1:]
+            assert not rest or rest[0]["role"] == "user"
+        assert memory.compacted > 0 and memory.compacted % 4 == 0
+        assert memory.dump()[0]["role"] == "system"
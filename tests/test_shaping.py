@@ -0,0 +1,29 @@
+# tests/test_shaping.py
+"""Recorte de resultados: la vista omite, pero nada se pierde y el pie dice cómo pedirlo."""
+from __future__ import annotations
+
+from src.core.shaping import ResultShaper
+from src.utils.jsonfmt import table_from_result
+
+
+def _shape(data, budget=400):
+    resp = {"result": {"structuredContent": {"result": data}}}
+    shaper = ResultShaper(budget)
+    text, handle = shaper.shape("fs_list", resp, table_from_result(resp["result"]))
+    page = lambda **args: shaper.page({"handle": handle, **args})["content"][0]["text"]
+    return text, handle, page
+
+
+def test_columnas_y_celdas_largas_se_recuperan():
+    rows = [{"id": i, "name": f"n{i}", "body": "x" * 300 + str(i)} for i in range(30)]
+    text, handle, page = _shape(rows)
+    assert handle and "columnas omitidas: body" in text and "Fin del resultado" not in text
+    assert "x" * 300 + "5" in page(offset=5, limit=1, columns=["id", "body"], char_offset=0)
+    last = page(offset=29, limit=1)
+    assert "Fin del resultado" not in last and "body" in last
+
+
+def test_fin_solo_sin_omisiones():
+    text, _handle, page = _shape([{"id": i, "n": "a"} for i in range(400)], budget=200)
+    assert "Fin del resultado" not in text
+    assert page(offset=390, limit=10).endswith("Fin del resultado]")
@@ -0,0 +1,25 @@
+# tests/test_toolselect.py
+"""Selección de tools: OPENAI_TOOLS puede crecer en otro hilo (--lazy) durante un select."""
+from __future__ import annotations
+
+from src.core.toolselect import ToolSelector
+
+
+def _tool(name: str, description: str):
+    return {"type": "function", "function": {"name": name, "description": description, "parameters": {"type": "object", "properties": {}}}}
+
+
+def test_la_lista_crece_durante_select():
+    tools = [_tool(f"fs_t{i}", f"operación de archivos {i}") for i in range(12)] + [_tool("sql_explain", "plan de consulta sql")]
+    selector = ToolSelector(tools, top_k=4)
+    index = selector._index
+
+    def grow(copy):
+        tools.append(_tool(f"anime__t{len(tools)}", "anime sql consulta"))  # import dinámico en otro hilo
+        index(copy)
+
+    selector._index = grow
+    chosen = selector.select("explica la consulta sql")
+    assert len(tools) == 14
+    assert chosen and all(t in tools[:13] for t in chosen)
+    assert chosen[0]["function"]["name"] == "sql_explain"
@@ -0,0 +1,24 @@
+# tests/test_validate.py
+"""Validación de argumentos: los defaults del esquema cuentan antes de `required`."""
+from __future__ import annotations
+
+import pytest
+
+from src.core.openai_client import OPENAI_TOOLS
+from src.core.validate import ArgumentError, compile_validator, schemas_by_name
+
+
+def test_fs_list_sin_argumentos_usa_el_default():
+    validate = compile_validator("fs_list", schemas_by_name(OPENAI_TOOLS)["fs_list"])
+    assert validate({}) == {"relative_path": "."}
+
+
+def test_requerido_sin_default_sigue_fallando():
+    validate = compile_validator("t", {
+        "type": "object",
+        "properties": {"path": {"type": "string"}, "depth": {"type": "integer", "default": 1}},
+        "required": ["path", "depth"],
+    })
+    assert validate({"path": "a"}) == {"path": "a", "depth": 1}
+    with pytest.raises(ArgumentError):
+        validate({})